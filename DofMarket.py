@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
 #coding=utf-8
+import os
 import sys
+import json
 import time
+import queue
+import asyncio
+import selectors
+import importlib.util
+from array import array
 import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from collections import deque, namedtuple, Counter
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Startup is measured from here (see record_startup), before the heavy imports below
+STARTUP_TIME = time.time()
+
 import cv2
+import numpy as np
 import tkinter as tk
-from tkinter import messagebox
 from PIL import Image, ImageTk
-from ultralytics import YOLO
 
 # Try importing the Arm library (Handle errors if running without arm for testing)
 try:
@@ -25,6 +40,51 @@ GRAB_TIME = 500
 GRIPPER_OPEN = 40
 GRIPPER_CLOSE = 138
 
+# Motion completion
+MOTION_MODE = 'closed_loop'   # 'closed_loop' polls servo positions, 'timed' sleeps the full move time
+POSITION_TOLERANCE = 3        # Degrees, a joint within this of its target counts as arrived
+POLL_INTERVAL = 0.02          # Seconds between servo position reads
+MOTION_TIMEOUT_MARGIN = 0.5   # Extra seconds past the move time before giving up on a move
+STALL_POLLS = 3               # Identical reads past the move time that count as blocked (gripper on fruit)
+SERVO_MAX_ANGLE = [180, 180, 180, 180, 270, 180]  # Servo 5 has a 270 degree range
+SIM_SERVO_SPEED = 300.0       # Degrees per second a simulated servo can move at most
+
+# Trajectory planning
+PLANNED_TRAJECTORIES = True   # False = every move takes MOVE_TIME and stops dead at each waypoint
+JOINT_SPEED_LIMIT = [60, 60, 60, 90, 120, 180]  # Degrees per second for each servo on planned moves
+MIN_MOVE_TIME = 300           # ms, floor for very small moves
+BLEND_TOLERANCE = 15          # Degrees, start the next move this close to a pass-through waypoint
+
+# Order queue
+PIPELINED_PICKS = True        # Back-to-back picks go drop -> next station without visiting home
+PIPELINE_MAX_PICKS = 5        # Safety: return home after this many picks in a row anyway
+
+# Kinematics (DOFBOT geometry in metres)
+# Frame: origin on the table under the base axis, +y straight ahead (servo 1 = 90), z up.
+LINK_BASE = 0.105             # Table to shoulder axis
+LINK_UPPER = 0.083            # Shoulder to elbow
+LINK_FORE = 0.083             # Elbow to wrist
+LINK_TOOL = 0.175             # Wrist to the middle of the gripper fingers
+IK_PITCHES = list(range(180, 85, -5))  # Tool angles from vertical to try, best first (180 = straight down)
+# Servo angle at which joints 2-4 are straight (in line with the link below them) and which way
+# a larger angle turns them (-1 = leans back). Fitted to FRUIT_STATIONS, refit after teaching
+# new stations with Test/arm/FitKinematics.py, check_kinematics() must agree before vision picks.
+JOINT_ZERO = [132, 40, 180]
+JOINT_SIGN = [-1, -1, -1]
+
+# Vision-guided picking: grab the fruit where the camera sees it instead of at its fixed station
+# Off until the kinematic model is fitted: check_kinematics() must agree with FRUIT_STATIONS first
+VISION_GUIDED_PICKING = False
+CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'table_calibration.json')
+# At least 4 reference points, camera pixel (u, v) -> table (x, y) in metres, taken at the scan pose.
+# e.g. [((112, 402), (-0.10, 0.12)), ((530, 398), (0.10, 0.12)), ((470, 150), (0.08, 0.28)), ((170, 152), (-0.08, 0.28))]
+CALIBRATION_POINTS = []
+GRASP_HEIGHT = 0.02           # Height above the table to close the gripper at, metres
+KINEMATICS_TOLERANCE = 0.03   # Metres FK of a calibrated station may sit off GRASP_HEIGHT before IK targets are refused
+DETECTION_MAX_AGE = 3.0       # Seconds, older detections are not trusted for picking
+CAMERA_ON_ARM = True          # Camera rides on the arm, so detections only count at the home / scan pose
+SCAN_SETTLE_TIME = 0.3        # Seconds at home before frames are trusted (motion blur, vibration)
+
 # Positions
 POS_DROP = [90, 110, 0, 10, 90, GRIPPER_OPEN]
 POS_HOME = [90, 130, 30, 0, 90, GRIPPER_OPEN]
@@ -38,6 +98,9 @@ FRUIT_STATIONS = {
     'strawberry': [65, 60, 70, 43, 90, GRIPPER_OPEN]
 }
 
+# Stations re-taught with Test/arm/TrajectoryRecorder.py, they override FRUIT_STATIONS
+STATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stations.json')
+
 FRUIT_PRICES = {
     'apple': 20,
     'banana': 25,
@@ -47,82 +110,2498 @@ FRUIT_PRICES = {
     'strawberry': 60
 }
 
+# Teach and replay (Test/arm/TrajectoryRecorder.py)
+TEACH_MAX_HZ = 200             # Upper bound on the sample rate, the servo bus is usually slower
+TEACH_SIMPLIFY_TOLERANCE = 2.0 # Degrees a replayed path may stray from the recording
+TEACH_STEADY_TIME = 1.0        # Seconds the arm must be held still to capture a station
+TEACH_STEADY_TOLERANCE = 2     # Degrees of jitter that still count as still
+
+# Metrics Config
+METRICS_WINDOW = 300      # Samples kept per stage for the rolling percentiles
+METRICS_EWMA = 0.1        # Smoothing factor for the event rates (0-1)
+METRICS_LOG_PATH = None   # JSON-lines file, e.g. '/home/pi/dofmarket_metrics.jsonl', None = off
+METRICS_INTERVAL = 5.0    # Seconds between JSON-lines records
+METRICS_PORT = 0          # Serves GET /metrics on 127.0.0.1:<port>, 0 = off
+
+# Display Config
+DISPLAY_SIZE = (640, 480)
+
+# Camera Config
+CAMERA_SOURCE = 'auto'        # 'auto' = cached / probed device, a device index, or a video file path
+CAMERA_PROBE_INDICES = [0, 1, 2, 3, 4]  # Device indices probed (all at once) when CAMERA_SOURCE = 'auto'
+CAMERA_PROBE_TIMEOUT = 3.0    # Seconds a device gets to open and deliver its first frame
+CAMERA_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'camera.json')
+CAMERA_SIZE = (640, 480)      # Width, height requested from the camera
+CAMERA_FPS = 30
+CAMERA_FOURCC = 'MJPG'        # Compressed USB stream: full frame rate at 640x480, None = driver default
+CAMERA_BUFFER_SIZE = 1        # Frames queued in the driver, 1 = reads always return the newest frame
+CAMERA_AUTO_EXPOSURE = 1      # V4L2 manual exposure mode (some drivers want 0.25), None = leave auto
+CAMERA_EXPOSURE = -5          # Fixed exposure, so it does not hunt while fruit moves
+CAMERA_BRIGHTNESS = 30
+CAMERA_CONTRAST = 30
+CAMERA_LOOP_VIDEO = True      # Video-file sources start over at the end
+
+# Web front-end (python3 DofMarket.py --web): MJPEG feed and JSON API instead of the Tk window
+WEB_HOST = '127.0.0.1'    # '0.0.0.0' lets a kiosk display elsewhere on the network connect
+WEB_PORT = 8080
+WEB_JPEG_QUALITY = 80
+WEB_MAX_BODY = 4096       # Bytes, larger POST bodies are refused unread (an order is a few dozen)
+
 # AI Config
 MODEL_PATH = '/home/pi/Documents/PythonCW/models/best.pt'
-CAMERA_INDEX = 0
+
+# Inference backend. 'auto' uses the first runtime in BACKEND_PREFERENCE that is
+# installed and has an exported model next to MODEL_PATH (see export_model.py).
+BACKEND = 'auto'
+# INT8 models come from quantize_model.py and are tried first.
+BACKEND_PREFERENCE = ['openvino_int8', 'tflite_int8', 'openvino', 'onnx', 'tflite', 'torch']
+# quantize_model.py writes <model>.accepted next to INT8 models that passed its accuracy gate,
+# INT8 models without one are never loaded
+INT8_ACCEPTED_SUFFIX = '.accepted'
+DETECT_CONF = 0.2
+DETECT_IMGSZ = 640
+INFERENCE_HZ = 0   # Detection rate cap, 0 = run as fast as the worker can
+
+# Inference region and resolution
+INFERENCE_ROI = None        # (x1, y1, x2, y2) tabletop area YOLO looks at, None = whole frame
+ADAPTIVE_IMGSZ = True       # Move imgsz between IMGSZ_STEPS to stay inside INFERENCE_BUDGET
+IMGSZ_STEPS = [320, 416, 512, 640]  # Input sizes the controller may use (multiples of 32)
+INFERENCE_BUDGET = 0.25     # Seconds per inference the controller aims for
+LOW_CONF_THRESHOLD = 0.5    # Mean confidence below this asks for a larger input size
+LOW_CONF_STRETCH = 1.5      # While confidence is low, inferences may take this times the budget
+IMGSZ_PATIENCE = 5          # Inferences in a row that must agree before the size changes
+DYNAMIC_SHAPE_BACKENDS = {'torch', 'onnx', 'openvino'}  # Exported with dynamic=True, others are fixed at 640
+
+# Colour cascade: a cheap HSV classifier settles clear frames, YOLO only runs when it is unsure
+COLOR_CASCADE = False
+# HSV bounds per fruit cube (OpenCV hue is 0-179). Starting points only, tune them for
+# your lighting with cascade_report.py. Overlapping ranges are fine, a blob that matches
+# two fruits is a conflict and goes to YOLO.
+COLOR_RANGES = {
+    'apple':      [((0, 120, 70), (7, 255, 255)), ((172, 120, 70), (179, 255, 255))],  # Red
+    'strawberry': [((160, 80, 70), (175, 255, 255))],   # Pink-red
+    'lychee':     [((140, 40, 90), (165, 180, 255))],   # Pink
+    'banana':     [((15, 100, 100), (25, 255, 255))],   # Golden yellow
+    'lemon':      [((22, 100, 120), (32, 255, 255))],   # Yellow
+    'kiwi':       [((35, 60, 40), (85, 255, 200))],     # Green
+}
+COLOR_SCALE = 0.5             # Downscale before the HSV pass
+COLOR_MIN_AREA = 600          # Pixels (full resolution) a blob needs to count as a cube
+COLOR_MIN_FILL = 0.6          # Share of its box a blob must fill, lower = odd shape, ask YOLO
+COLOR_MAX_ASPECT = 2.0        # Longer/shorter box side above this = cubes touching, ask YOLO
+COLOR_CONFLICT_IOU = 0.3      # Boxes of two colours overlapping this much = conflict, ask YOLO
+CASCADE_VERIFY_INTERVAL = 5.0 # Seconds, YOLO checks the scene at least this often anyway
+
+# Process pipeline
+PIPELINE_MODE = 'threads'   # 'processes' = camera and YOLO in their own processes, frames in shared memory
+SHM_SLOTS = 4               # Frames in the shared-memory ring (at least 2)
+SHM_POLL_INTERVAL = 0.002   # Seconds between checks for a new frame in the ring
+CPU_CAPTURE = {0}           # Cores for each process, None = let the OS decide (Linux only)
+CPU_GUI = {1}
+CPU_INFERENCE = {2, 3}
+TORCH_THREADS = 2           # torch intra-op threads in the inference process, 0 = torch default
+
+# Motion gate: only re-run detection when the watched region changes
+MOTION_GATE = True
+MOTION_THRESHOLD = 0.005  # Share of thumbnail pixels that must change (one cube is about 1.5%)
+MOTION_PIXEL_DELTA = 25   # Levels (0-255) any channel of a thumbnail pixel must change by to count
+MOTION_MAX_AGE = 2.0     # Seconds, detections are refreshed at least this often
+MOTION_ROI = None        # (x1, y1, x2, y2) region to watch, None = whole frame
+
+# Tracker: keeps boxes moving and labels stable between detections
+TRACK_IOU_MATCH = 0.3       # Minimum IoU to match a detection to an existing track
+TRACK_MAX_MISSES = 3        # Detection rounds a track survives without a match
+TRACK_BOX_GAIN = 0.6        # How far a box jumps towards each new detection (0-1)
+TRACK_VELOCITY_GAIN = 0.3   # How fast the velocity estimate follows the detections (0-1)
+TRACK_LABEL_GAIN = 0.3      # How fast class votes and confidence follow the detections (0-1)
+TRACK_PREDICT_HORIZON = 0.5 # Seconds boxes are extrapolated past the last detection
+
+# METRICS
+
+class Metrics:
+    """
+    Thread-safe hot-path telemetry.
+    Stage durations go into rolling windows (percentiles on demand) and event
+    rates are tracked as an EWMA of the interval between ticks.
+    """
+    def __init__(self, window=METRICS_WINDOW, alpha=METRICS_EWMA):
+        self.window = window
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.durations = {}   # stage -> deque of seconds
+        self.intervals = {}   # rate name -> [last tick time, EWMA interval]
+        self.values = {}      # one-off values such as startup times
+
+    def record(self, stage, seconds):
+        with self.lock:
+            samples = self.durations.get(stage)
+            if samples is None:
+                samples = self.durations[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def tick(self, name):
+        now = time.perf_counter()
+        with self.lock:
+            state = self.intervals.get(name)
+            if state is None:
+                self.intervals[name] = [now, None]
+                return
+            interval = now - state[0]
+            state[0] = now
+            if state[1] is None:
+                state[1] = interval
+            else:
+                state[1] += self.alpha * (interval - state[1])
+
+    def rate(self, name):
+        """EWMA events per second, 0 until two ticks have been seen."""
+        with self.lock:
+            state = self.intervals.get(name)
+            if not state or not state[1]:
+                return 0.0
+            return 1.0 / state[1]
+
+    def set_value(self, name, value):
+        with self.lock:
+            self.values[name] = value
+
+    def percentile_ms(self, stage, q):
+        with self.lock:
+            samples = list(self.durations.get(stage, ()))
+        if not samples:
+            return 0.0
+        return float(np.percentile(samples, q)) * 1000.0
+
+    def snapshot(self):
+        """Everything as a JSON-friendly dict."""
+        with self.lock:
+            durations = {k: list(v) for k, v in self.durations.items()}
+            rates = {k: (1.0 / v[1] if v[1] else 0.0) for k, v in self.intervals.items()}
+            values = dict(self.values)
+
+        stages = {}
+        for stage, samples in durations.items():
+            if not samples:
+                continue
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000.0
+            stages[stage] = {
+                'n': len(samples),
+                'last_ms': round(samples[-1] * 1000.0, 2),
+                'p50_ms': round(float(p50), 2),
+                'p95_ms': round(float(p95), 2),
+                'p99_ms': round(float(p99), 2),
+            }
+        return {
+            'time': time.time(),
+            'stages': stages,
+            'rates_hz': {k: round(v, 2) for k, v in rates.items()},
+            'values': values,
+        }
+
+# Shared by every thread in the app
+METRICS = Metrics()
+
+
+def record_startup(milestone):
+    """Stores seconds since STARTUP_TIME as the startup_<milestone>_s metric."""
+    elapsed = time.time() - STARTUP_TIME
+    METRICS.set_value(f'startup_{milestone}_s', round(elapsed, 3))
+    return elapsed
+
+
+def record_model_load(detector):
+    METRICS.set_value('model_load_s', round(detector.load_time, 3))
+    METRICS.set_value('model_warmup_s', round(detector.warmup_time, 3))
+    elapsed = record_startup('model_ready')
+    print(f"Model ready {elapsed:.1f}s after start (load {detector.load_time:.1f}s, "
+          f"warm-up {detector.warmup_time:.1f}s)")
+
+class MetricsExporter:
+    """Publishes METRICS snapshots as JSON lines and/or on a local HTTP endpoint."""
+    def __init__(self, metrics, log_path=METRICS_LOG_PATH, port=METRICS_PORT, interval=METRICS_INTERVAL):
+        self.metrics = metrics
+        self.log_path = log_path
+        self.port = port
+        self.interval = interval
+        self.running = False
+        self.server = None
+
+    def start(self):
+        self.running = True
+        if self.log_path:
+            threading.Thread(target=self._log_loop, daemon=True).start()
+
+        if self.port:
+            metrics = self.metrics
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.rstrip('/') != '/metrics':
+                        self.send_error(404)
+                        return
+                    body = json.dumps(metrics.snapshot()).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass  # Keep the console clean
+
+            # Localhost only, this is for the maintainer, not the customers
+            self.server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            print(f"Metrics available at http://127.0.0.1:{self.port}/metrics")
+        return self
+
+    def _log_loop(self):
+        while self.running:
+            time.sleep(self.interval)
+            try:
+                with open(self.log_path, 'a') as f:
+                    f.write(json.dumps(self.metrics.snapshot()) + '\n')
+            except OSError as e:
+                print(f"Error writing metrics: {e}")
+
+    def stop(self):
+        self.running = False
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+# CAMERA CAPTURE
+
+def probe_cameras(indices=CAMERA_PROBE_INDICES, timeout=CAMERA_PROBE_TIMEOUT):
+    """
+    Opens every index at once on its own thread, so one slow or hung device
+    cannot hold up the others. Returns [(index, open cv2.VideoCapture)] for the
+    devices that delivered a frame within timeout, lowest index first.
+    """
+    results = queue.Queue()
+    abandoned = threading.Event()
+
+    def probe(index):
+        cap = cv2.VideoCapture(index)
+        ok = cap.isOpened() and cap.read()[0]
+        # Too late or no frame: nobody will take this capture, release it here
+        if not ok or abandoned.is_set():
+            cap.release()
+            cap = None
+        results.put((index, cap))
+
+    for index in indices:
+        threading.Thread(target=probe, args=(index,), daemon=True).start()
+
+    found = []
+    deadline = time.monotonic() + timeout
+    for _ in indices:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            index, cap = results.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if cap is not None:
+            found.append((index, cap))
+    abandoned.set()
+    # Anything that finished between the deadline and abandoned.set()
+    while not results.empty():
+        _, cap = results.get_nowait()
+        if cap is not None:
+            cap.release()
+    return sorted(found, key=lambda item: item[0])
+
+def configure_camera(cap, size=CAMERA_SIZE):
+    """Asks the driver for the low-latency capture mode and returns what it actually granted."""
+    if CAMERA_FOURCC:
+        # Before the size: the fourcc decides which sizes and rates are on offer
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*CAMERA_FOURCC))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+    cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, CAMERA_BUFFER_SIZE)
+    if CAMERA_AUTO_EXPOSURE is not None:
+        cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, CAMERA_AUTO_EXPOSURE)
+        cap.set(cv2.CAP_PROP_EXPOSURE, CAMERA_EXPOSURE)
+    cap.set(cv2.CAP_PROP_BRIGHTNESS, CAMERA_BRIGHTNESS)
+    cap.set(cv2.CAP_PROP_CONTRAST, CAMERA_CONTRAST)
+
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    return {
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': cap.get(cv2.CAP_PROP_FPS),
+        'fourcc': ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00'),
+        'buffer_size': int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+    }
+
+class VideoFileSource:
+    """
+    A video file that reads like a live camera: frames come at the file's frame rate
+    and it starts over at the end (CAMERA_LOOP_VIDEO), so the app runs without hardware.
+    """
+    def __init__(self, path, loop=CAMERA_LOOP_VIDEO):
+        self.path = path
+        self.loop = loop
+        self.cap = cv2.VideoCapture(path)
+        self.interval = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or CAMERA_FPS)
+        self.next_time = time.monotonic()
+
+    def read(self, image=None):
+        delay = self.next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_time = max(self.next_time + self.interval, time.monotonic())
+
+        ret, frame = self.cap.read(image)
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(image)
+        return ret, frame
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+def load_camera_cache(path=CAMERA_CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def open_camera(source=CAMERA_SOURCE, size=CAMERA_SIZE):
+    """
+    Opens the frame source with the low-latency settings. 'auto' tries the device
+    cached in CAMERA_CACHE_PATH first and only probes every index when that fails.
+    """
+    if isinstance(source, str) and source != 'auto':
+        print(f"Camera: replaying {source}")
+        return VideoFileSource(source)
+
+    cap = None
+    index = source
+    if source == 'auto':
+        cached = load_camera_cache()
+        cached_index = cached.get('index') if isinstance(cached, dict) else None
+        found = probe_cameras([cached_index]) if cached_index is not None else []
+        if not found:
+            started = time.perf_counter()
+            # The cached device just failed, don't wait on it a second time
+            found = probe_cameras([i for i in CAMERA_PROBE_INDICES if i != cached_index])
+            print(f"Camera probe: {[i for i, _ in found]} answered in {time.perf_counter() - started:.2f}s")
+        if found:
+            # Keep the first camera open, no need to open it a second time
+            (index, cap), others = found[0], found[1:]
+            for _, other in others:
+                other.release()
+        else:
+            print("WARNING: No camera found.")
+            index = CAMERA_PROBE_INDICES[0]
+    if cap is None:
+        cap = cv2.VideoCapture(index)
+    if not cap.isOpened():
+        print(f"WARNING: Could not open camera {index}.")
+        return cap
+
+    with METRICS.timer('camera_setup'):
+        granted = configure_camera(cap, size)
+    print(f"Camera {index}: {granted}")
+    if source == 'auto':
+        try:
+            with open(CAMERA_CACHE_PATH, 'w') as f:
+                json.dump({'index': index}, f)
+        except OSError as e:
+            print(f"Could not cache camera choice: {e}")
+    return cap
+
+class FrameGrabber:
+    """
+    Reads frames from a cv2.VideoCapture on its own thread.
+    Only the newest frame is kept (single slot), older ones are dropped, so
+    consumers never wait behind a backlog of stale frames.
+    Without a cap it calls open_fn on that thread first, so a slow camera probe
+    never holds up the caller.
+    """
+    def __init__(self, cap=None, open_fn=open_camera):
+        self.cap = cap          # None until open_fn has returned
+        self.open_fn = open_fn
+        self.cond = threading.Condition()
+        self.frame = None
+        self.seq = 0            # Increments with every frame captured
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def _capture_loop(self):
+        if self.cap is None:
+            cap = self.open_fn()
+            if not self.running:
+                cap.release()  # Stopped while the camera was opening
+                return
+            self.cap = cap
+        while self.running:
+            with METRICS.timer('capture'):
+                ret, frame = self.cap.read()
+            if not ret:
+                # Camera hiccup, back off a little instead of spinning
+                time.sleep(0.01)
+                continue
+
+            with self.cond:
+                self.frame = frame
+                self.seq += 1
+                self.cond.notify_all()
+            METRICS.tick('camera')
+
+    def latest(self):
+        """Returns (seq, frame) for the newest frame without blocking."""
+        with self.cond:
+            return self.seq, self.frame
+
+    def wait_next(self, last_seq, timeout=None):
+        """Blocks until a frame newer than last_seq exists, then returns (seq, frame)."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > last_seq or not self.running, timeout)
+            return self.seq, self.frame
+
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+# AI INFERENCE
+
+# Python modules each backend needs at runtime
+BACKEND_RUNTIMES = {
+    'openvino_int8': ['openvino'],
+    'tflite_int8': ['tflite_runtime', 'tensorflow'],
+    'openvino': ['openvino'],
+    'onnx': ['onnxruntime'],
+    'tflite': ['tflite_runtime', 'tensorflow'],
+    'torch': ['torch'],
+}
+
+def exported_model_paths(model_path):
+    """Where export_model.py / quantize_model.py (via ultralytics) put each format for a given .pt file."""
+    stem = os.path.splitext(model_path)[0]
+    name = os.path.basename(stem)
+    return {
+        'openvino_int8': f"{stem}_int8_openvino_model",
+        'tflite_int8': os.path.join(f"{stem}_saved_model", f"{name}_int8.tflite"),
+        'openvino': f"{stem}_openvino_model",
+        'onnx': f"{stem}.onnx",
+        'tflite': os.path.join(f"{stem}_saved_model", f"{name}_float32.tflite"),
+        'torch': model_path,
+    }
+
+def available_backends(model_path):
+    """Returns [(backend, path)] for every backend with both a runtime and a model file (INT8: an accepted one)."""
+    paths = exported_model_paths(model_path)
+    found = []
+    for backend, modules in BACKEND_RUNTIMES.items():
+        has_runtime = any(importlib.util.find_spec(m) is not None for m in modules)
+        if backend.endswith('_int8') and not os.path.exists(paths[backend] + INT8_ACCEPTED_SUFFIX):
+            continue
+        if has_runtime and os.path.exists(paths[backend]):
+            found.append((backend, paths[backend]))
+    return found
+
+# One row per detection: box in pixels, class id, confidence and the Tracker's id (0 = not matched yet).
+# Detector, Tracker, draw_tracks and select_grasp all pass these arrays around, never per-box objects.
+DETECTION_DTYPE = np.dtype([('xyxy', np.float32, (4,)), ('cls', np.int32),
+                            ('conf', np.float32), ('track_id', np.int32)])
+
+def empty_detections(count=0):
+    return np.zeros(count, dtype=DETECTION_DTYPE)
+
+class Detector:
+    """
+    Wraps the YOLO model behind one interface whatever runtime executes it.
+    Every backend is loaded through ultralytics, so results come back in the
+    same format and detect() always returns a DETECTION_DTYPE array.
+    """
+    def __init__(self, model_path=MODEL_PATH, backend=BACKEND):
+        candidates = dict(available_backends(model_path))
+        if backend == 'auto':
+            order = BACKEND_PREFERENCE
+        else:
+            order = [backend]
+
+        for name in order:
+            if name in candidates:
+                self.backend = name
+                self.path = candidates[name]
+                break
+        else:
+            raise FileNotFoundError(f"No usable model for backend '{backend}' at {model_path}")
+
+        print(f"Using {self.backend} backend: {self.path}")
+        started = time.perf_counter()
+        # Imported here, not at the top: ultralytics pulls in torch and takes seconds to load
+        from ultralytics import YOLO
+        self.model = YOLO(self.path, task='detect')
+        self.names = self.model.names
+        self.dynamic_shape = self.backend in DYNAMIC_SHAPE_BACKENDS
+        self.last_stage = 'yolo'   # Which stage produced the last detections (see CascadeDetector)
+        self.load_time = time.perf_counter() - started
+        self.warmup_time = 0.0
+
+    def warmup(self, size=CAMERA_SIZE, imgsz=DETECT_IMGSZ):
+        """One throwaway inference on a blank frame, so the first real frame runs at full speed."""
+        started = time.perf_counter()
+        blank = np.zeros((size[1], size[0], 3), np.uint8)
+        self.model(blank, conf=DETECT_CONF, imgsz=imgsz, device='cpu', verbose=False)
+        self.warmup_time = time.perf_counter() - started
+        return self.warmup_time
+
+    def detect(self, frame, conf=DETECT_CONF, imgsz=DETECT_IMGSZ, roi=INFERENCE_ROI):
+        """
+        Runs the model on one frame and returns its detections as a DETECTION_DTYPE array.
+        With a roi only that (x1, y1, x2, y2) part of the frame is searched; boxes are
+        still returned in full-frame pixels.
+        """
+        x_offset = y_offset = 0
+        if roi is not None:
+            x1, y1, x2, y2 = roi
+            frame = frame[y1:y2, x1:x2]
+            x_offset, y_offset = x1, y1
+
+        # device='cpu' keeps every backend off the GPU path, the Pi has none
+        with METRICS.timer('inference'):
+            results = self.model(frame, conf=conf, imgsz=imgsz, device='cpu', verbose=False)
+
+        with METRICS.timer('postprocess'):
+            # One transfer for every box at once: rows of x1, y1, x2, y2, conf, cls
+            data = results[0].boxes.cpu().numpy().data
+            detections = empty_detections(len(data))
+            detections['xyxy'] = data[:, :4]
+            detections['conf'] = data[:, -2]
+            detections['cls'] = data[:, -1]
+            if x_offset or y_offset:
+                detections['xyxy'] += (x_offset, y_offset, x_offset, y_offset)
+        return detections
+
+class MotionGate:
+    """
+    Cheap scene-change detector run on every frame before YOLO.
+    The frame is shrunk to a tiny thumbnail and compared with the thumbnail
+    of the frame that was last sent to the model. The score is the share of pixels
+    that changed by more than pixel_delta, so one cube added or removed counts even
+    though it barely moves the mean of the whole frame.
+    """
+    def __init__(self, threshold=MOTION_THRESHOLD, max_age=MOTION_MAX_AGE, roi=MOTION_ROI, size=(64, 48),
+                 pixel_delta=MOTION_PIXEL_DELTA):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.max_age = max_age
+        self.roi = roi
+        self.size = size
+        self.reference = None
+        self.reference_time = 0.0
+        self.last_score = 0.0
+
+    def _thumbnail(self, frame):
+        if self.roi is not None:
+            x1, y1, x2, y2 = self.roi
+            frame = frame[y1:y2, x1:x2]
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        # Blur away sensor noise so it does not count as motion. Colour is kept: a green
+        # cube on a grey table has almost the same grey level as the table.
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def should_run(self, frame):
+        """Returns True when the scene changed enough (or the last detection is too old)."""
+        thumb = self._thumbnail(frame)
+        now = time.time()
+
+        if self.reference is not None and (now - self.reference_time) < self.max_age:
+            changed = cv2.absdiff(thumb, self.reference).max(axis=2) > self.pixel_delta
+            self.last_score = float(changed.mean())
+            if self.last_score < self.threshold:
+                return False
+
+        # This frame goes to the model, so it becomes the new reference
+        self.reference = thumb
+        self.reference_time = now
+        return True
+
+class ImgszController:
+    """
+    Picks the YOLO input size for each inference. It steps down through IMGSZ_STEPS
+    while inferences run over INFERENCE_BUDGET and back up while the next size is
+    expected to fit. When mean confidence drops below LOW_CONF_THRESHOLD the budget
+    is stretched by LOW_CONF_STRETCH, so hard scenes get more pixels.
+    Only useful on backends that accept dynamic input shapes (Detector.dynamic_shape).
+    """
+    def __init__(self, steps=IMGSZ_STEPS, budget=INFERENCE_BUDGET, start=DETECT_IMGSZ,
+                 patience=IMGSZ_PATIENCE):
+        self.steps = sorted(steps)
+        self.budget = budget
+        self.patience = patience
+        self.index = min(range(len(self.steps)), key=lambda i: abs(self.steps[i] - start))
+        self.latency = {}   # EWMA seconds per size, from the inferences seen so far
+        self.votes = 0      # +patience = step up, -patience = step down
+        METRICS.set_value('imgsz', self.imgsz)
+
+    @property
+    def imgsz(self):
+        return self.steps[self.index]
+
+    def expected_latency(self, index):
+        size = self.steps[index]
+        if size in self.latency:
+            return self.latency[size]
+        # Not measured yet: inference time grows roughly with the pixel count
+        current = self.latency[self.imgsz]
+        return current * (size / self.imgsz) ** 2
+
+    def update(self, latency, detections):
+        """Feeds back one inference, returns the size to use for the next one."""
+        size = self.imgsz
+        if size in self.latency:
+            self.latency[size] += METRICS_EWMA * (latency - self.latency[size])
+        else:
+            self.latency[size] = latency
+
+        budget = self.budget
+        if len(detections) and float(detections['conf'].mean()) < LOW_CONF_THRESHOLD:
+            budget *= LOW_CONF_STRETCH
+
+        if self.latency[size] > budget and self.index > 0:
+            vote = -1
+        elif self.index < len(self.steps) - 1 and self.expected_latency(self.index + 1) <= budget:
+            vote = 1
+        else:
+            vote = 0
+
+        # Only move after several inferences in a row agree, one slow frame is not a trend
+        if vote == 0 or (vote > 0) != (self.votes > 0):
+            self.votes = 0
+        self.votes += vote
+        if abs(self.votes) >= self.patience:
+            self.index += 1 if self.votes > 0 else -1
+            self.votes = 0
+            METRICS.set_value('imgsz', self.imgsz)
+        return self.imgsz
+
+def imgsz_controller_for(detector):
+    """An ImgszController when ADAPTIVE_IMGSZ is on and the backend can change size, else None."""
+    if ADAPTIVE_IMGSZ and detector.dynamic_shape:
+        return ImgszController()
+    return None
+
+class ColorClassifier:
+    """
+    Finds the fruit cubes by colour alone: one HSV conversion of a downscaled frame,
+    an inRange mask per fruit and connected components for the boxes.
+    classify() returns the same DETECTION_DTYPE array as the Detector (class ids from
+    the model's names, blob fill as confidence) and whether the result is clear enough
+    to skip YOLO.
+    """
+    def __init__(self, names, ranges=COLOR_RANGES, scale=COLOR_SCALE):
+        ids = {str(name).lower(): cls for cls, name in names.items()}
+        self.ranges = [(ids[fruit], [(np.array(lo, np.uint8), np.array(hi, np.uint8)) for lo, hi in bounds])
+                       for fruit, bounds in ranges.items() if fruit in ids]
+        self.scale = scale
+        self.kernel = np.ones((3, 3), np.uint8)
+
+    def classify(self, frame, roi=INFERENCE_ROI):
+        """Returns (detections, sure)."""
+        x_offset = y_offset = 0
+        if roi is not None:
+            x1, y1, x2, y2 = roi
+            frame = frame[y1:y2, x1:x2]
+            x_offset, y_offset = x1, y1
+        if self.scale != 1:
+            frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        min_area = COLOR_MIN_AREA * self.scale ** 2
+
+        boxes, classes, fills = [], [], []
+        sure = True
+        for cls, bounds in self.ranges:
+            mask = cv2.inRange(hsv, *bounds[0])
+            for lo, hi in bounds[1:]:
+                mask |= cv2.inRange(hsv, lo, hi)
+            # Opening removes speckles so noise does not turn into blobs
+            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
+            _, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+            stats = stats[1:]  # Row 0 is the background
+            stats = stats[stats[:, cv2.CC_STAT_AREA] >= min_area]
+            if not len(stats):
+                continue
+            x, y, w, h, area = stats.T
+            fill = area / (w * h)
+            aspect = np.maximum(w, h) / np.maximum(np.minimum(w, h), 1)
+            # Odd shapes are partial or touching cubes, YOLO separates those better
+            if (fill < COLOR_MIN_FILL).any() or (aspect > COLOR_MAX_ASPECT).any():
+                sure = False
+            boxes.append(np.stack([x, y, x + w, y + h], axis=1))
+            classes.append(np.full(len(stats), cls))
+            fills.append(fill)
+
+        # Seeing nothing is no proof there is nothing, a cube may just have drifted out of its range
+        if not boxes:
+            return empty_detections(), False
+        detections = empty_detections(sum(len(b) for b in boxes))
+        detections['xyxy'] = np.concatenate(boxes) / self.scale + (x_offset, y_offset, x_offset, y_offset)
+        detections['cls'] = np.concatenate(classes)
+        detections['conf'] = np.concatenate(fills)
+
+        # Two colours claiming the same spot (e.g. banana vs lemon yellow) is a conflict
+        iou = box_iou(detections['xyxy'], detections['xyxy'])
+        np.fill_diagonal(iou, 0.0)
+        if (iou > COLOR_CONFLICT_IOU).any():
+            sure = False
+        return detections, sure
+
+class CascadeDetector:
+    """
+    Colour first, YOLO only when needed (COLOR_CASCADE). Frames the ColorClassifier is
+    sure about never reach the model; unsure frames, conflicts, frames whose fruit
+    differ from what YOLO last saw and one frame every CASCADE_VERIFY_INTERVAL seconds
+    go to YOLO. Same interface as Detector.
+    """
+    def __init__(self, detector, clock=time.time):
+        self.detector = detector
+        self.clock = clock  # Swappable so cascade_report.py can replay a dataset at a set frame rate
+        self.colors = ColorClassifier(detector.names)
+        self.names = detector.names
+        self.backend = detector.backend
+        self.dynamic_shape = detector.dynamic_shape
+        self.load_time = detector.load_time
+        self.warmup_time = detector.warmup_time
+        self.last_stage = 'yolo'
+        self.last_verified = 0.0
+        self.verified_classes = None  # Counter of the classes YOLO saw at the last check
+        self.settled = 0      # Frames answered by colour alone
+        self.deferred = 0     # Frames sent on to YOLO
+
+    def warmup(self, *args, **kwargs):
+        return self.detector.warmup(*args, **kwargs)
+
+    def detect(self, frame, conf=DETECT_CONF, imgsz=DETECT_IMGSZ, roi=INFERENCE_ROI):
+        with METRICS.timer('color'):
+            detections, sure = self.colors.classify(frame, roi)
+
+        now = self.clock()
+        # A fruit colour lost or mistook since the last check must not vanish until the next one
+        if sure and Counter(detections['cls'].tolist()) != self.verified_classes:
+            sure = False
+        if sure and now - self.last_verified < CASCADE_VERIFY_INTERVAL:
+            self.last_stage = 'color'
+            self.settled += 1
+        else:
+            self.last_stage = 'yolo'
+            self.deferred += 1
+            self.last_verified = now
+            detections = self.detector.detect(frame, conf=conf, imgsz=imgsz, roi=roi)
+            self.verified_classes = Counter(detections['cls'].tolist())
+        METRICS.set_value('color_settled_share', round(self.settled / (self.settled + self.deferred), 3))
+        return detections
+
+class InferenceWorker:
+    """
+    Runs the Detector on a background thread against the newest frame from a FrameGrabber.
+    Frames that arrive while a detection is running are skipped, never queued,
+    and every result is published with the frame seq and a timestamp.
+    With a MotionGate attached, unchanged frames are skipped as well.
+    With an ImgszController the input size follows its latency budget.
+    on_result(seq, timestamp, detections, inference_time) is called after each inference.
+    """
+    def __init__(self, grabber, detector, target_hz=INFERENCE_HZ, motion_gate=None, on_result=None,
+                 imgsz_controller=None):
+        self.grabber = grabber
+        self.detector = detector
+        self.target_hz = target_hz
+        self.motion_gate = motion_gate
+        self.on_result = on_result
+        self.imgsz_controller = imgsz_controller
+        self.skipped_frames = 0  # Frames the motion gate judged unchanged, reported as gate_skipped
+        self.lock = threading.Lock()
+        self.result = (0, 0.0, empty_detections())  # (frame seq, timestamp, detections)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._inference_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def _inference_loop(self):
+        last_seq = 0
+        while self.running:
+            seq, frame = self.grabber.wait_next(last_seq, timeout=0.5)
+            if frame is None or seq == last_seq:
+                continue
+            last_seq = seq
+
+            # Static scene: keep the previous detections instead of re-running YOLO
+            if self.motion_gate:
+                with METRICS.timer('gate'):
+                    run_detector = self.motion_gate.should_run(frame)
+                if not run_detector:
+                    self.skipped_frames += 1
+                    METRICS.set_value('gate_skipped', self.skipped_frames)
+                    continue
+
+            imgsz = self.imgsz_controller.imgsz if self.imgsz_controller else DETECT_IMGSZ
+            started = time.time()
+            try:
+                detections = self.detector.detect(frame, imgsz=imgsz)
+            except Exception as e:
+                print(f"Error in inference thread: {e}")
+                detections = empty_detections()
+            finished = time.time()
+            # Colour-only answers say nothing about how long YOLO takes
+            if self.imgsz_controller and self.detector.last_stage == 'yolo':
+                self.imgsz_controller.update(finished - started, detections)
+
+            with self.lock:
+                self.result = (seq, started, detections)
+            METRICS.tick('detect')
+            if self.on_result:
+                self.on_result(seq, started, detections, finished - started)
+
+            # Optional rate cap, otherwise go straight to the next newest frame
+            if self.target_hz > 0:
+                remaining = (1.0 / self.target_hz) - (finished - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+
+    @property
+    def names(self):
+        return self.detector.names
+
+    def latest_result(self):
+        """Returns (frame seq, timestamp, detections) for the newest finished inference."""
+        with self.lock:
+            return self.result
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+# PROCESS PIPELINE
+
+def pin_to_cores(cores, label):
+    """Keeps the calling process (and threads it starts later) on the given CPU cores."""
+    if not cores or not hasattr(os, 'sched_setaffinity'):
+        return
+    try:
+        os.sched_setaffinity(0, cores)
+        print(f"{label}: pinned to cores {sorted(cores)}")
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Could not pin {label} to cores {sorted(cores)}: {e}")
+
+
+def set_torch_threads(threads):
+    """Limits torch intra-op threads so inference stays on its own cores."""
+    if threads <= 0:
+        return
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+class SharedFrameRing:
+    """
+    Ring of frames in multiprocessing.shared_memory with one writer process and
+    any number of readers. The header holds the newest seq and the seq stored in
+    each slot, so a reader can tell when the writer lapped it mid-read.
+    Reads like a FrameGrabber (latest / wait_next), so it can stand in for one.
+    """
+    def __init__(self, shape, slots=SHM_SLOTS, name=None):
+        self.shape = tuple(shape)
+        self.slots = max(slots, 2)
+        header_bytes = 8 * (self.slots + 1)
+        self.owner = name is None
+        if self.owner:
+            size = header_bytes + self.slots * int(np.prod(self.shape))
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        # header[0] = newest seq, header[1 + i] = seq held in slot i (-1 while it is being written)
+        self.header = np.ndarray((self.slots + 1,), np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray((self.slots,) + self.shape, np.uint8, buffer=self.shm.buf, offset=header_bytes)
+        if self.owner:
+            self.header[:] = 0
+        self.buffer = None  # Private frame handed out by wait_next
+        self.running = True
+        self.closed = False
+
+    def spec(self):
+        """Arguments another process passes to SharedFrameRing to attach to this ring."""
+        return self.shape, self.slots, self.shm.name
+
+    def claim(self):
+        """Writer: returns (seq, slot array) to fill in place, then call publish(seq)."""
+        seq = int(self.header[0]) + 1
+        self.header[1 + seq % self.slots] = -1
+        return seq, self.frames[seq % self.slots]
+
+    def publish(self, seq):
+        self.header[1 + seq % self.slots] = seq
+        self.header[0] = seq
+
+    def latest(self):
+        """
+        Returns (seq, frame) for the newest frame without blocking or copying.
+        The frame lives in shared memory and is reused SHM_SLOTS frames later,
+        so copy it right away (the GUI draws on a copy anyway).
+        Returns (0, None) once the ring is closed.
+        """
+        header, frames = self.header, self.frames
+        if header is None or frames is None:
+            return 0, None
+        seq = int(header[0])
+        if seq == 0:
+            return 0, None
+        return seq, frames[seq % self.slots]
+
+    def wait_next(self, last_seq, timeout=None):
+        """
+        Waits for a frame newer than last_seq and returns (seq, frame) with the frame
+        copied into a buffer owned by this reader, for consumers that hold on to it
+        longer than the ring takes to wrap (inference). Returns (last_seq, None) once closed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.running:
+            header, frames = self.header, self.frames
+            if header is None or frames is None:
+                break
+            seq = int(header[0])
+            if seq > last_seq:
+                slot = seq % self.slots
+                if self.buffer is None:
+                    self.buffer = np.empty(self.shape, np.uint8)
+                np.copyto(self.buffer, frames[slot])
+                if header[1 + slot] == seq:
+                    return seq, self.buffer
+                # Overwritten during the copy, take the newer frame instead
+                continue
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            time.sleep(SHM_POLL_INTERVAL)
+        return last_seq, None
+
+    def close(self):
+        """Detaches from the segment (and unlinks it, for the owner). Safe to call again."""
+        if self.closed:
+            return
+        self.closed = True
+        self.running = False
+        # Views into the segment have to go before it can be closed
+        self.header = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # A caller still holds a frame view, the OS frees it at exit
+        if self.owner:
+            self.shm.unlink()
+
+
+def capture_process(ring_spec, camera_source, stop_event):
+    """Camera process: decodes frames straight into the shared ring."""
+    pin_to_cores(CPU_CAPTURE, 'capture')
+    ring = SharedFrameRing(*ring_spec)
+    height, width = ring.shape[:2]
+    cap = open_camera(camera_source, (width, height))
+    while not stop_event.is_set():
+        seq, slot = ring.claim()
+        ret, frame = cap.read(slot)
+        if not ret:
+            time.sleep(0.01)
+            continue
+        # OpenCV only fills the slot in place when size and type match
+        if not np.shares_memory(frame, slot):
+            if frame.shape != slot.shape:
+                frame = cv2.resize(frame, (width, height))
+            slot[...] = frame
+        ring.publish(seq)
+    cap.release()
+    ring.close()
+
+
+def inference_process(ring_spec, results, stop_event):
+    """Inference process: runs an InferenceWorker on the ring and sends results back."""
+    pin_to_cores(CPU_INFERENCE, 'inference')
+    set_torch_threads(TORCH_THREADS)
+    ring = SharedFrameRing(*ring_spec)
+    try:
+        detector = Detector(MODEL_PATH)
+        detector.warmup(ring.shape[1::-1])
+        if COLOR_CASCADE:
+            detector = CascadeDetector(detector)
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        results.put(('failed', str(e)))
+        ring.close()
+        return
+    results.put(('ready', (detector.names, detector.load_time, detector.warmup_time)))
+
+    def send(seq, started, detections, inference_time):
+        results.put(('result', (seq, started, detections, inference_time)))
+
+    motion_gate = MotionGate() if MOTION_GATE else None
+    worker = InferenceWorker(ring, detector, motion_gate=motion_gate, on_result=send,
+                             imgsz_controller=imgsz_controller_for(detector)).start()
+    stop_event.wait()
+    ring.running = False
+    worker.stop()
+    ring.close()
+
+
+class ProcessPipeline:
+    """
+    Camera and YOLO in their own processes (PIPELINE_MODE = 'processes'), so capture,
+    inference and Tk each get a core instead of sharing one under the GIL.
+    Frames go through a SharedFrameRing, detections come back on a Queue.
+    Stands in for both the FrameGrabber and the InferenceWorker in the GUI.
+    """
+    def __init__(self, camera_source=CAMERA_SOURCE, size=CAMERA_SIZE, run_inference=True):
+        # Forking a process that already runs Tk and threads is not safe, so spawn
+        ctx = mp.get_context('spawn')
+        width, height = size
+        self.ring = SharedFrameRing((height, width, 3))
+        self.stop_event = ctx.Event()
+        self.results = ctx.Queue()
+        self.lock = threading.Lock()
+        self.names = {}
+        self.state = 'loading' if run_inference else 'off'  # Model state in the inference process
+        self.result = (0, 0.0, empty_detections())  # (frame seq, timestamp, detections)
+        self.processes = [ctx.Process(target=capture_process, name='dofmarket-capture', daemon=True,
+                                      args=(self.ring.spec(), camera_source, self.stop_event))]
+        if run_inference:
+            self.processes.append(ctx.Process(target=inference_process, name='dofmarket-inference', daemon=True,
+                                              args=(self.ring.spec(), self.results, self.stop_event)))
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        return self
+
+    def latest(self):
+        return self.ring.latest()
+
+    def wait_next(self, last_seq, timeout=None):
+        return self.ring.wait_next(last_seq, timeout)
+
+    def latest_result(self):
+        """Returns (frame seq, timestamp, detections) for the newest result from the inference process."""
+        with self.lock:
+            while True:
+                try:
+                    kind, payload = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == 'ready':
+                    self.names, load_time, warmup_time = payload
+                    self.state = 'ready'
+                    METRICS.set_value('model_load_s', round(load_time, 3))
+                    METRICS.set_value('model_warmup_s', round(warmup_time, 3))
+                    record_startup('model_ready')
+                elif kind == 'failed':
+                    self.state = 'failed'
+                else:
+                    seq, started, detections, inference_time = payload
+                    self.result = (seq, started, detections)
+                    # The inference process has its own METRICS, mirror its numbers here
+                    METRICS.record('inference', inference_time)
+                    METRICS.tick('detect')
+            return self.result
+
+    def stop(self):
+        # Checkout and then closing the window both stop the video
+        if self.ring.closed:
+            return
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        self.ring.close()
+
+# OBJECT TRACKING
+
+def box_iou(boxes_a, boxes_b):
+    """IoU matrix between two (N, 4) and (M, 4) arrays of x1, y1, x2, y2 boxes."""
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+class Track:
+    """One fruit followed across detections with a constant-velocity box filter."""
+    def __init__(self, track_id, box, cls, conf, timestamp):
+        self.id = track_id
+        self.box = np.array(box, dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)  # Pixels per second for each coordinate
+        self.class_scores = {cls: conf}
+        self.conf = conf
+        self.timestamp = timestamp
+        self.misses = 0
+
+    @property
+    def cls(self):
+        # Majority vote over recent detections, weighted by confidence
+        return max(self.class_scores, key=self.class_scores.get)
+
+    def predict(self, timestamp):
+        dt = min(max(timestamp - self.timestamp, 0.0), TRACK_PREDICT_HORIZON)
+        return self.box + self.velocity * dt
+
+    def update(self, box, cls, conf, timestamp):
+        dt = timestamp - self.timestamp
+        predicted = self.predict(timestamp)
+        residual = np.asarray(box, dtype=np.float32) - predicted
+
+        # Alpha-beta filter: nudge the box and velocity towards the measurement
+        self.box = predicted + TRACK_BOX_GAIN * residual
+        if dt > TRACK_PREDICT_HORIZON:
+            # Long gap means the motion gate saw a static scene, so the fruit is not moving
+            self.velocity[:] = 0
+        elif dt > 0:
+            self.velocity = self.velocity + TRACK_VELOCITY_GAIN * residual / dt
+
+        # Smooth label and confidence so a single bad frame cannot flip them
+        for k in self.class_scores:
+            self.class_scores[k] *= (1 - TRACK_LABEL_GAIN)
+        self.class_scores[cls] = self.class_scores.get(cls, 0.0) + TRACK_LABEL_GAIN * conf
+        self.conf += TRACK_LABEL_GAIN * (conf - self.conf)
+
+        self.timestamp = timestamp
+        self.misses = 0
+
+class Tracker:
+    """
+    Greedy IoU tracker. update() is called with every new set of detections,
+    predict() on every displayed frame to move boxes between detections.
+    Not thread-safe, only the Tk loop uses it.
+    """
+    def __init__(self):
+        self.tracks = []
+        self.next_id = 1
+
+    def update(self, detections, timestamp):
+        """Matches a DETECTION_DTYPE array to the tracks and writes the track ids into its track_id column."""
+        boxes = detections['xyxy']
+        matched_tracks = set()
+        matched_dets = set()
+
+        if self.tracks and len(detections):
+            predicted = np.array([t.predict(timestamp) for t in self.tracks], dtype=np.float32)
+            iou = box_iou(predicted, boxes)
+
+            # Best pairs first, each track and detection used at most once
+            for flat in np.argsort(-iou, axis=None):
+                ti, di = np.unravel_index(flat, iou.shape)
+                if iou[ti, di] < TRACK_IOU_MATCH:
+                    break
+                if ti in matched_tracks or di in matched_dets:
+                    continue
+                track = self.tracks[ti]
+                track.update(boxes[di], int(detections['cls'][di]), float(detections['conf'][di]), timestamp)
+                detections['track_id'][di] = track.id
+                matched_tracks.add(ti)
+                matched_dets.add(di)
+
+        # Missed tracks age out, unmatched detections start new tracks
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= TRACK_MAX_MISSES]
+
+        for di in range(len(detections)):
+            if di not in matched_dets:
+                self.tracks.append(Track(self.next_id, boxes[di], int(detections['cls'][di]),
+                                         float(detections['conf'][di]), timestamp))
+                detections['track_id'][di] = self.next_id
+                self.next_id += 1
+
+    def predict(self, timestamp):
+        """Returns every live track at this time as a DETECTION_DTYPE array."""
+        tracks = empty_detections(len(self.tracks))
+        for i, t in enumerate(self.tracks):
+            tracks[i] = (t.predict(timestamp), t.cls, t.conf, t.id)
+        return tracks
+
+# DISPLAY
+
+def draw_tracks(frame, tracks, names):
+    """Draws a DETECTION_DTYPE array onto a BGR frame in place, labels are only formatted here."""
+    for b, cls, conf, track_id in zip(tracks['xyxy'].astype(int).tolist(), tracks['cls'].tolist(),
+                                      tracks['conf'].tolist(), tracks['track_id'].tolist()):
+        x1, y1, x2, y2 = b
+        label_text = f"#{track_id} {names[cls]} {conf:.2f}"
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(frame, label_text, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 
+                    0.5, (0, 255, 0), 2)
+
+class FrameRenderer:
+    """
+    Pushes BGR frames into one reused Tk PhotoImage.
+    PIL unpacks the BGR bytes straight to RGB, so there is no separate cvtColor pass,
+    and frames already at display size are never resampled.
+    """
+    def __init__(self, size=DISPLAY_SIZE):
+        self.size = size
+        self.scaled = None  # Reused resize buffer, only needed if the camera size differs
+        self.photo = None
+
+    def to_image(self, frame):
+        """BGR numpy frame -> RGB PIL image at display size."""
+        h, w = frame.shape[:2]
+        if (w, h) != self.size:
+            # Bilinear is plenty for a live preview and far cheaper than LANCZOS
+            self.scaled = cv2.resize(frame, self.size, dst=self.scaled, interpolation=cv2.INTER_LINEAR)
+            frame = self.scaled
+        elif not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+        return Image.frombuffer('RGB', self.size, frame, 'raw', 'BGR', 0, 1)
+
+    def render(self, frame, label):
+        with METRICS.timer('convert'):
+            img = self.to_image(frame)
+        with METRICS.timer('blit'):
+            if self.photo is None:
+                self.photo = ImageTk.PhotoImage('RGB', self.size)
+                label.imgtk = self.photo
+                label.configure(image=self.photo)
+            # paste() updates the existing Tk image in place, no new PhotoImage per frame
+            self.photo.paste(img)
 
 # HARDWARE CONTROL CLASS
 
+class SimulatedArm:
+    """
+    Stands in for Arm_Device when there is no hardware.
+    Implements the Arm_Lib calls the app uses; each servo moves linearly to its
+    target over the commanded time (slower if that would exceed SIM_SERVO_SPEED)
+    and Arm_serial_servo_read reports where it is right now.
+    """
+    def __init__(self, clock=time.monotonic, verbose=True, start_angles=POS_HOME):
+        self.clock = clock
+        self.verbose = verbose
+        now = clock()
+        # Per servo: (start angle, target angle, start time, duration in seconds)
+        self.motion = [(float(a), float(a), now, 0.0) for a in start_angles]
+
+    def _position(self, index, now):
+        start, target, started, duration = self.motion[index]
+        if duration <= 0 or now >= started + duration:
+            return target
+        return start + (target - start) * (now - started) / duration
+
+    def _command(self, index, angle, time_ms):
+        now = self.clock()
+        start = self._position(index, now)
+        target = float(min(max(angle, 0), SERVO_MAX_ANGLE[index]))
+        duration = max(time_ms / 1000.0, abs(target - start) / SIM_SERVO_SPEED)
+        self.motion[index] = (start, target, now, duration)
+
+    def Arm_serial_servo_write6(self, s1, s2, s3, s4, s5, s6, time_ms):
+        if self.verbose:
+            print(f"[SIM] Moving to {[s1, s2, s3, s4, s5, s6]} over {time_ms}ms")
+        for index, angle in enumerate([s1, s2, s3, s4, s5, s6]):
+            self._command(index, angle, time_ms)
+
+    def Arm_serial_servo_write(self, servo_id, angle, time_ms):
+        if self.verbose:
+            print(f"[SIM] Servo {servo_id} set to {angle} over {time_ms}ms")
+        self._command(servo_id - 1, angle, time_ms)
+
+    def Arm_serial_servo_read(self, servo_id):
+        return int(round(self._position(servo_id - 1, self.clock())))
+
+    def Arm_serial_set_torque(self, onoff):
+        # Nobody can move a simulated arm by hand, so this only logs
+        if self.verbose:
+            print(f"[SIM] Torque {'on' if onoff else 'off'}")
+
+# KINEMATICS
+
+def forward_kinematics(angles, zero=None, sign=None):
+    """
+    Gripper position for many poses at once.
+    angles: (N, >=4) servo angles in degrees. Returns (N, 3) x, y, z and (N,) tool pitch in degrees.
+    zero / sign default to JOINT_ZERO / JOINT_SIGN; (M, 1, 3) arrays score M conventions at
+    once and return (M, N, 3) and (M, N), which is how FitKinematics.py searches for them.
+    """
+    angles = np.atleast_2d(np.asarray(angles, dtype=np.float64))
+    zero = np.asarray(JOINT_ZERO if zero is None else zero, dtype=np.float64)
+    sign = np.asarray(JOINT_SIGN if sign is None else sign, dtype=np.float64)
+    yaw = np.radians(angles[:, 0])
+    # Each of joints 2-4 leans away from the link below it by sign * (servo - zero)
+    lean = np.cumsum(np.radians(sign * (angles[:, 1:4] - zero)), axis=-1)
+    lean1, lean2, lean3 = lean[..., 0], lean[..., 1], lean[..., 2]
+
+    reach = LINK_UPPER * np.sin(lean1) + LINK_FORE * np.sin(lean2) + LINK_TOOL * np.sin(lean3)
+    z = LINK_BASE + LINK_UPPER * np.cos(lean1) + LINK_FORE * np.cos(lean2) + LINK_TOOL * np.cos(lean3)
+    xyz = np.stack([reach * np.cos(yaw), reach * np.sin(yaw), z], axis=-1)
+    return xyz, np.degrees(lean3)
+
+def inverse_kinematics(targets, pitches=IK_PITCHES):
+    """
+    Closed-form IK for many targets in one call.
+    targets: (N, 3) x, y, z. Every pitch in pitches and both elbow solutions are
+    evaluated at once; the first pitch (then elbow-up) inside the servo limits wins.
+    Returns (N, 6) servo angles with the gripper open, NaN rows where unreachable.
+    """
+    targets = np.atleast_2d(np.asarray(targets, dtype=np.float64))
+    x, y, z = targets[:, 0:1, None], targets[:, 1:2, None], targets[:, 2:3, None]  # (N, 1, 1)
+    pitch = np.radians(np.asarray(pitches, dtype=np.float64))[None, :, None]        # (1, P, 1)
+    elbow = np.array([1.0, -1.0])[None, None, :]                                      # (1, 1, 2)
+
+    # Wrist centre in the arm's vertical plane
+    reach = np.hypot(x, y)
+    wrist_r = reach - LINK_TOOL * np.sin(pitch)
+    wrist_z = z - LINK_BASE - LINK_TOOL * np.cos(pitch)
+
+    # Two-link solve for shoulder and elbow
+    cos_bend = (wrist_r ** 2 + wrist_z ** 2 - LINK_UPPER ** 2 - LINK_FORE ** 2) / (2 * LINK_UPPER * LINK_FORE)
+    bend = elbow * np.arccos(np.clip(cos_bend, -1.0, 1.0))
+    lean1 = np.arctan2(wrist_r, wrist_z) - np.arctan2(LINK_FORE * np.sin(bend), LINK_UPPER + LINK_FORE * np.cos(bend))
+    lean2 = lean1 + bend
+
+    yaw = np.degrees(np.arctan2(y, x)) + np.zeros_like(bend)
+    # Inverse of forward_kinematics: servo = zero + sign * lean (sign is +-1)
+    zero, sign = JOINT_ZERO, JOINT_SIGN
+    s2 = zero[0] + sign[0] * np.degrees(lean1)
+    s3 = zero[1] + sign[1] * np.degrees(lean2 - lean1)
+    s4 = zero[2] + sign[2] * np.degrees(pitch - lean2)
+    solutions = np.stack(np.broadcast_arrays(yaw, s2, s3, s4), axis=-1)               # (N, P, 2, 4)
+
+    valid = (np.abs(cos_bend) <= 1.0) & np.all((solutions >= 0) & (solutions <= 180), axis=-1)
+
+    # First valid candidate in preference order (pitch, then elbow)
+    flat_valid = valid.reshape(len(targets), -1)
+    choice = np.argmax(flat_valid, axis=1)
+    found = flat_valid[np.arange(len(targets)), choice]
+    chosen = solutions.reshape(len(targets), -1, 4)[np.arange(len(targets)), choice]
+
+    result = np.full((len(targets), 6), np.nan)
+    result[found, :4] = chosen[found]
+    result[found, 4] = 90
+    result[found, 5] = GRIPPER_OPEN
+    return result
+
+def check_kinematics(stations=None):
+    """
+    Worst distance (metres) between GRASP_HEIGHT and the gripper height forward_kinematics()
+    gives for the hand-calibrated stations. Those poses really grasp cubes on the table,
+    so a large value means the joint convention (JOINT_ZERO / JOINT_SIGN) is wrong and IK
+    targets would miss.
+    """
+    stations = FRUIT_STATIONS if stations is None else stations
+    # Where the servos really go: e.g. a station's -15 is driven to 0
+    angles = np.clip(np.asarray(list(stations.values()), dtype=np.float64), 0, SERVO_MAX_ANGLE)
+    xyz, _ = forward_kinematics(angles)
+    return float(np.max(np.abs(xyz[:, 2] - GRASP_HEIGHT)))
+
+# CAMERA CALIBRATION
+
+class TableCalibration:
+    """
+    Camera pixel -> table plane homography from a few reference points.
+    The result is cached in CALIBRATION_PATH together with the points it was
+    computed from, and recomputed only when CALIBRATION_POINTS change.
+    """
+    def __init__(self, points=CALIBRATION_POINTS, path=CALIBRATION_PATH):
+        self.path = path
+        self.points = [[list(map(float, uv)), list(map(float, xy))] for uv, xy in points]
+        self.homography = self._load()
+        if self.homography is None and len(self.points) >= 4:
+            self.homography = self._compute()
+
+    @property
+    def ready(self):
+        return self.homography is not None
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # A cache made from other points (or no points configured at all) is still usable
+        if self.points and data.get('points') != self.points:
+            return None
+        return np.array(data['homography'], dtype=np.float64)
+
+    def _compute(self):
+        pixels = np.array([uv for uv, _ in self.points], dtype=np.float64)
+        table = np.array([xy for _, xy in self.points], dtype=np.float64)
+        homography, _ = cv2.findHomography(pixels, table, cv2.RANSAC if len(self.points) > 4 else 0)
+        if homography is None:
+            print("WARNING: Calibration points are degenerate, vision-guided picking disabled.")
+            return None
+        try:
+            with open(self.path, 'w') as f:
+                json.dump({'points': self.points, 'homography': homography.tolist()}, f, indent=2)
+        except OSError as e:
+            print(f"Could not cache calibration: {e}")
+        return homography
+
+    def pixel_to_table(self, pixels):
+        """(N, 2) pixel coordinates -> (N, 2) table x, y in metres."""
+        pts = np.asarray(pixels, dtype=np.float64).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(pts, self.homography).reshape(-1, 2)
+
+def select_grasp(detections, names, fruit_name):
+    """Most confident detection of fruit_name as a pixel grasp point (box centre), or None."""
+    wanted = [cls for cls, name in names.items() if str(name).lower() == fruit_name]
+    matches = detections[np.isin(detections['cls'], wanted)]
+    if not len(matches):
+        return None
+    x1, y1, x2, y2 = matches['xyxy'][np.argmax(matches['conf'])]
+    return (float(x1 + x2) / 2.0, float(y1 + y2) / 2.0)
+
+# TRAJECTORY PLANNING
+
+# kind: 'move' or 'grip', angles: full 6 servo pose, duration: ms,
+# blend: pass through this waypoint without stopping, phase: METRICS name,
+# tolerance: degrees from a blended waypoint at which the next move is sent
+Step = namedtuple('Step', ['kind', 'angles', 'duration', 'blend', 'status', 'phase', 'tolerance'],
+                  defaults=[BLEND_TOLERANCE])
+
+def segment_duration(start, target):
+    """Move time in ms so the joint with the largest travel stays under its JOINT_SPEED_LIMIT."""
+    seconds = max(abs(t - s) / speed for s, t, speed in zip(start, target, JOINT_SPEED_LIMIT))
+    return max(MIN_MOVE_TIME, int(round(seconds * 1000)))
+
+def plan_pickup(pickup_angles, start_angles=None, planned=True, start_home=True, end_home=True):
+    """
+    Builds the pickup sequence as Steps: home -> station -> grab -> lift -> drop -> release -> home.
+    With planned=False every move takes MOVE_TIME and stops at every waypoint,
+    which is how the sequence was always run.
+    start_angles is where the arm is now (None = unknown, so it always homes first).
+    For back-to-back picks start_home / end_home = False go straight from the
+    drop zone to the next station, and gripper commands that would not change
+    anything are left out.
+    """
+    # Same waypoints as the hand-calibrated sequence
+    target_pos = list(pickup_angles)
+    target_pos[5] = GRIPPER_OPEN
+    pos_lift = [pickup_angles[0], 130, 30, 0, 90, GRIPPER_CLOSE]
+    drop_pos_closed = list(POS_DROP)
+    drop_pos_closed[5] = GRIPPER_CLOSE
+    home_open = list(POS_HOME)
+    home_open[5] = GRIPPER_OPEN
+
+    plan = []
+    current = list(start_angles) if start_angles is not None else None
+
+    def move(angles, status, phase, blend=False):
+        nonlocal current
+        if planned and current is not None:
+            duration = segment_duration(current, angles)
+        else:
+            duration = MOVE_TIME
+        plan.append(Step('move', list(angles), duration, blend and planned, status, phase))
+        current = list(angles)
+
+    def grip(angle, status, phase):
+        nonlocal current
+        if planned and current[5] == angle:
+            return  # Already there, the command would only cost GRAB_TIME
+        current = current[:5] + [angle]
+        plan.append(Step('grip', list(current), GRAB_TIME, False, status, phase))
+
+    # 1. Start from Home
+    if start_home or current is None:
+        move(POS_HOME, "Moving Home...", 'home')
+        grip(GRIPPER_OPEN, None, 'home')
+    # 2. Move to Fruit Position
+    move(target_pos, "Reaching for fruit...", 'reach')
+    # 3. Grab
+    grip(GRIPPER_CLOSE, "Grabbing...", 'grab')
+    # 4. Lift Up, no grip change before the drop so flow straight through it
+    move(pos_lift, "Lifting fruit...", 'lift', blend=True)
+    # 5. Move to Drop Zone
+    move(drop_pos_closed, "Moving to drop zone...", 'to_drop')
+    # 6. Drop
+    grip(GRIPPER_OPEN, "Dropping fruit...", 'release')
+    # 7. Return Home
+    if end_home:
+        move(home_open, "Returning Home...", 'return')
+    return plan
+
+class VirtualClock:
+    """Simulated time for running arm sequences against SimulatedArm without waiting."""
+    def __init__(self, start=0.0):
+        self.t = start
+
+    def now(self):
+        return self.t
+
+    def sleep(self, seconds):
+        self.t += max(seconds, 0.0)
+
+def reachable_targets(targets):
+    """Clamps {servo_id: angle} to the servo ranges, a servo can't report an angle it can't reach."""
+    return {sid: min(max(angle, 0), SERVO_MAX_ANGLE[sid - 1]) for sid, angle in targets.items()}
+
+def servos_arrived(readings, targets, tolerance):
+    return all(abs(readings[sid] - targets[sid]) <= tolerance for sid in targets)
+
+def stall_is_arrival(readings, targets, tolerance):
+    """
+    Servos stopped short of their targets. Only the gripper may be blocked on purpose
+    (closed on a fruit); a stalled joint 1-5 is a jam or collision, reported as a fault.
+    """
+    joints = {sid: angle for sid, angle in targets.items() if sid != 6}
+    if servos_arrived(readings, joints, tolerance):
+        return True
+    print(f"WARNING: Servos stalled at {readings}, wanted {targets}")
+    return False
+
+# ASYNC ARM DRIVER
+
+class _VirtualTimeSelector(selectors.DefaultSelector):
+    """Instead of blocking until the next timer is due, jumps the VirtualClock forward to it."""
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            # No timers at all, only I/O (e.g. call_soon_threadsafe) can wake us
+            return super().select(None)
+        self.clock.sleep(timeout)
+        return events
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """
+    asyncio event loop running on a VirtualClock: asyncio.sleep, wait_for timeouts
+    etc. all complete instantly in real time but in the right virtual order.
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        super().__init__(selector=_VirtualTimeSelector(clock))
+
+    def time(self):
+        return self.clock.now()
+
+class AsyncArmDriver:
+    """
+    The arm's motion code, on asyncio: every move is awaitable and cancellable, and
+    cancelling one (emergency stop) makes every servo hold where it is. Servo writes
+    issued in the same loop iteration are coalesced into a single bus write.
+    RoboticArmController runs it for the app; tests drive it directly.
+    The arm's clock must match the loop's (time.monotonic, or VirtualClock.now
+    with a VirtualTimeLoop).
+    """
+    def __init__(self, arm, motion_mode=MOTION_MODE):
+        self.Arm = arm
+        self.motion_mode = motion_mode
+        # Last commanded pose, None until the first move (the start pose is unknown)
+        self.pose = None
+        self.motion_fault = False   # Set when a move timed out, stalled or a sequence was cut short
+        self.picks_since_home = 0
+        self.last_cycle_time = 0.0
+        self.home_since = None      # time.time() the arm settled at home (scan pose), None when away
+        self.pending = {}           # servo id -> angle waiting for the next flush
+        self.pending_time = 0       # ms for the pending write (longest requested)
+        self.flush_scheduled = False
+        self.last_write_time = 0    # ms of the last write sent
+        self.bus_writes = 0         # Actual writes sent, to see the coalescing at work
+
+    def _write(self, servos, time_ms):
+        """Queues {servo_id: angle}; everything queued this iteration goes out together."""
+        self.pending.update(servos)
+        self.pending_time = max(self.pending_time, time_ms)
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self.flush_scheduled = False
+        servos, time_ms = self.pending, self.pending_time
+        self.pending, self.pending_time = {}, 0
+        if not servos:
+            return
+        self.last_write_time = time_ms
+
+        if self.pose is not None or len(servos) == 6:
+            # One write6 covers any mix of servos once the rest of the pose is known
+            pose = list(self.pose) if self.pose is not None else [0] * 6
+            for sid, angle in servos.items():
+                pose[sid - 1] = angle
+            self.Arm.Arm_serial_servo_write6(pose[0], pose[1], pose[2], pose[3], pose[4], pose[5], time_ms)
+            self.pose = pose
+            self.bus_writes += 1
+        else:
+            for sid, angle in servos.items():
+                self.Arm.Arm_serial_servo_write(sid, angle, time_ms)
+                self.bus_writes += 1
+
+    async def move(self, angles, duration, tolerance=POSITION_TOLERANCE):
+        """
+        Moves all 6 servos. A move that times out or stalls short sets motion_fault.
+        tolerance above POSITION_TOLERANCE returns early, for blending into the next move.
+        """
+        self.home_since = None
+        targets = dict(enumerate(angles[:6], start=1))
+        self._write(targets, duration)
+        arrived = await self._wait(targets, duration, tolerance, settle=0.1)
+        if not arrived:
+            self.motion_fault = True
+        elif self.pose[:5] == POS_HOME[:5]:
+            # Wall-clock on purpose, it is compared with camera frame timestamps
+            self.home_since = time.time()
+        return arrived
+
+    async def set_gripper(self, angle):
+        self._write({6: angle}, GRAB_TIME)
+        return await self._wait({6: angle}, GRAB_TIME, POSITION_TOLERANCE)
+
+    async def _wait(self, targets, duration, tolerance, settle=0.0):
+        try:
+            # Let the coalesced write go out before polling. It runs at the
+            # longest time any of its callers asked for, so wait for that.
+            await asyncio.sleep(0)
+            duration = max(duration, self.last_write_time)
+            if self.motion_mode != 'closed_loop':
+                await asyncio.sleep(duration / 1000.0 + settle)
+                return True
+            return await self.wait_for_position(targets, duration, tolerance)
+        except asyncio.CancelledError:
+            self.emergency_stop()
+            raise
+
+    async def wait_for_position(self, targets, duration, tolerance=POSITION_TOLERANCE):
+        """
+        Polls the servos until every one in targets ({servo_id: angle}) is within
+        tolerance. Returns True on arrival, also when only the gripper is blocked
+        (closing on a fruit), False on timeout or when joints 1-5 stall short.
+        """
+        loop = asyncio.get_running_loop()
+        targets = reachable_targets(targets)
+        move_end = loop.time() + duration / 1000.0
+        deadline = move_end + MOTION_TIMEOUT_MARGIN
+        last_readings = None
+        stable_polls = 0
+
+        while True:
+            readings = {sid: self.Arm.Arm_serial_servo_read(sid) for sid in targets}
+
+            # Read errors (None) just mean we poll again
+            if None not in readings.values():
+                if servos_arrived(readings, targets, tolerance):
+                    return True
+
+                # Only once the move should be over can "not moving" mean blocked
+                if loop.time() >= move_end and readings == last_readings:
+                    stable_polls += 1
+                    if stable_polls >= STALL_POLLS:
+                        return stall_is_arrival(readings, targets, tolerance)
+                else:
+                    stable_polls = 0
+                last_readings = readings
+
+            if loop.time() >= deadline:
+                print(f"WARNING: Move timed out, servos at {readings}, wanted {targets}")
+                return False
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def emergency_stop(self):
+        """Drops queued writes and commands every servo to hold its current angle."""
+        self.pending, self.pending_time = {}, 0
+        self.motion_fault = True
+        self.home_since = None
+        angles = [self.Arm.Arm_serial_servo_read(i) for i in range(1, 7)]
+        if self.pose is not None:
+            # A failed read keeps the last commanded angle rather than sending None
+            angles = [a if a is not None else p for a, p in zip(angles, self.pose)]
+        if None in angles:
+            print("WARNING: Emergency stop could not read every servo")
+            return
+        self.Arm.Arm_serial_servo_write6(angles[0], angles[1], angles[2], angles[3], angles[4], angles[5], MIN_MOVE_TIME)
+        self.pose = angles
+        self.bus_writes += 1
+
+    def set_torque(self, on):
+        """Torque off lets the arm be moved by hand, after that the pose is unknown."""
+        self.Arm.Arm_serial_set_torque(1 if on else 0)
+        if not on:
+            self.pose = None
+            self.home_since = None
+
+    def needs_home(self):
+        """Safety check before chaining another pick without going home."""
+        return self.pose is None or self.motion_fault or self.picks_since_home >= PIPELINE_MAX_PICKS
+
+    async def execute_plan(self, plan, update_status_callback):
+        """
+        Runs a list of Steps. Blended moves only wait until the arm is within the
+        step's tolerance (BLEND_TOLERANCE unless set) of the waypoint before the next
+        move is sent, so the servos flow through it instead of stopping.
+        Every phase is timed into METRICS as arm_<phase>.
+        """
+        loop = asyncio.get_running_loop()
+        sequence_start = loop.time()
+        phase = None
+        phase_start = sequence_start
+
+        for step in plan:
+            if step.phase != phase:
+                if phase:
+                    METRICS.record(f"arm_{phase}", loop.time() - phase_start)
+                phase = step.phase
+                phase_start = loop.time()
+            if step.status:
+                update_status_callback(step.status)
+
+            if step.kind == 'grip':
+                await self.set_gripper(step.angles[5])
+            elif step.blend and self.motion_mode == 'closed_loop':
+                await self.move(step.angles, step.duration, step.tolerance)
+            else:
+                await self.move(step.angles, step.duration)
+
+        if phase:
+            METRICS.record(f"arm_{phase}", loop.time() - phase_start)
+        METRICS.record('arm_sequence', loop.time() - sequence_start)
+
+    async def run_pickup_sequence(self, pickup_angles, update_status_callback, planned=None, pipelined=False):
+        """
+        Executes the pickup logic using the specific pickup_angles passed in.
+        pipelined=True leaves the arm at the drop zone, call return_home() when the queue is empty.
+        """
+        if planned is None:
+            planned = PLANNED_TRAJECTORIES
+        start_home = not pipelined or self.needs_home()
+        plan = plan_pickup(pickup_angles, start_angles=self.pose, planned=planned,
+                           start_home=start_home, end_home=not pipelined)
+        if start_home:
+            self.motion_fault = False
+            self.picks_since_home = 0
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            await self.execute_plan(plan, update_status_callback)
+        except BaseException:
+            # Unknown state (or stopped), make the next pick start from home
+            self.motion_fault = True
+            raise
+        self.picks_since_home += 1
+        self.last_cycle_time = loop.time() - started
+        METRICS.record('arm_cycle', self.last_cycle_time)
+
+        if pipelined:
+            update_status_callback(f"Picked in {self.last_cycle_time:.1f}s")
+        else:
+            update_status_callback("Ready")
+
+    async def return_home(self, update_status_callback):
+        """Ends a run of pipelined picks."""
+        if self.pose is not None and self.pose[:5] == POS_HOME[:5]:
+            update_status_callback("Ready")
+            return
+        update_status_callback("Returning Home...")
+        home_open = list(POS_HOME)
+        home_open[5] = GRIPPER_OPEN
+        if PLANNED_TRAJECTORIES and self.pose is not None:
+            duration = segment_duration(self.pose, home_open)
+        else:
+            duration = MOVE_TIME
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await self.move(home_open, duration)
+        METRICS.record('arm_return', loop.time() - started)
+        self.picks_since_home = 0
+        update_status_callback("Ready")
+
+class EmergencyStop(Exception):
+    """Raised by RoboticArmController when emergency_stop() cut a sequence short."""
+
 class RoboticArmController:
-    def __init__(self):
-        if arm_available:
-            self.Arm = Arm_Device()
-            time.sleep(0.1)
+    """
+    Blocking front-end for the order queue and the scripts. Each call runs the matching
+    AsyncArmDriver coroutine to completion on the controller's own event loop, so there
+    is only one implementation of the motion code. emergency_stop() works from any
+    thread: it cancels the running sequence (the servos hold where they are) and refuses
+    new moves until resume().
+    """
+    def __init__(self, arm=None, clock=None, motion_mode=MOTION_MODE):
+        # clock = a VirtualClock runs everything on simulated time, None = real time
+        if clock is None:
+            self.loop = asyncio.new_event_loop()
+            now = time.monotonic
         else:
-            self.Arm = None
+            self.loop = VirtualTimeLoop(clock)
+            now = clock.now
+
+        if arm is None and arm_available:
+            arm = Arm_Device()
+            time.sleep(0.1)
+        elif arm is None:
+            arm = SimulatedArm(now)
+        self.driver = AsyncArmDriver(arm, motion_mode)
+        self.Arm = arm
+
+        self.run_lock = threading.Lock()   # One sequence at a time, whichever thread asks
+        self.task_lock = threading.Lock()  # Guards task / stopped against emergency_stop()
+        self.task = None
+        self.stopped = False
+
+    # Pose and safety state live in the driver
+    @property
+    def pose(self):
+        return self.driver.pose
+
+    @property
+    def motion_fault(self):
+        return self.driver.motion_fault
+
+    @property
+    def picks_since_home(self):
+        return self.driver.picks_since_home
+
+    @property
+    def last_cycle_time(self):
+        return self.driver.last_cycle_time
+
+    @property
+    def home_since(self):
+        return self.driver.home_since
+
+    def _run(self, coro):
+        """Runs a driver coroutine to completion, raises EmergencyStop if it was stopped."""
+        with self.run_lock:
+            with self.task_lock:
+                if self.stopped:
+                    coro.close()
+                    raise EmergencyStop("Emergency stop, resume before moving")
+                self.task = self.loop.create_task(coro)
+            try:
+                return self.loop.run_until_complete(self.task)
+            except asyncio.CancelledError:
+                raise EmergencyStop("Emergency stop") from None
+            finally:
+                with self.task_lock:
+                    self.task = None
+
+    def emergency_stop(self):
+        """Holds the arm where it is and refuses further moves until resume(). Safe from any thread."""
+        with self.task_lock:
+            self.stopped = True
+            if self.task is not None:
+                self.loop.call_soon_threadsafe(self.task.cancel)
+
+    def resume(self):
+        """Allows moves again after emergency_stop(), the next pick starts from home."""
+        self.stopped = False
 
     def move_arm(self, angles, duration):
-        if self.Arm:
-            self.Arm.Arm_serial_servo_write6(angles[0], angles[1], angles[2], angles[3], angles[4], angles[5], duration)
-            time.sleep((duration / 1000.0) + 0.1)
-        else:
-            print(f"[SIM] Moving to {angles} over {duration}ms")
-            time.sleep((duration / 1000.0))
+        self._run(self.driver.move(angles, duration))
 
     def set_gripper(self, angle):
-        if self.Arm:
-            self.Arm.Arm_serial_servo_write(6, angle, 500)
-            time.sleep(0.5)
+        self._run(self.driver.set_gripper(angle))
+
+    def angles_for_xyz(self, xyz):
+        """Servo angles (gripper open) that put the gripper at a tabletop (x, y, z) in metres."""
+        error = check_kinematics()
+        if error > KINEMATICS_TOLERANCE:
+            raise ValueError(f"Kinematic model is {error:.3f} m off the calibrated stations, "
+                             "fit JOINT_ZERO / JOINT_SIGN with Test/arm/FitKinematics.py")
+        angles = inverse_kinematics([xyz])[0]
+        if np.isnan(angles).any():
+            raise ValueError(f"Target {tuple(xyz)} is out of reach")
+        return [int(round(a)) for a in angles]
+
+    def move_to_xyz(self, xyz, duration=None):
+        angles = self.angles_for_xyz(xyz)
+        if duration is None:
+            duration = segment_duration(self.pose, angles) if self.pose is not None else MOVE_TIME
+        self.move_arm(angles, duration)
+
+    def run_pickup_at(self, xyz, update_status_callback, **kwargs):
+        """run_pickup_sequence with a Cartesian pickup point instead of a calibrated station."""
+        self.run_pickup_sequence(self.angles_for_xyz(xyz), update_status_callback, **kwargs)
+
+    def read_angles(self):
+        """Current angle of all 6 servos, None for any read that failed."""
+        return [self.Arm.Arm_serial_servo_read(i) for i in range(1, 7)]
+
+    def set_torque(self, on):
+        self.driver.set_torque(on)
+
+    def replay_trajectory(self, trajectory, update_status_callback, keep_timing=False):
+        """Drives the arm through a taught Trajectory's waypoints."""
+        self.execute_plan(trajectory.plan(self.pose, keep_timing), update_status_callback)
+        update_status_callback("Ready")
+
+    def needs_home(self):
+        return self.driver.needs_home()
+
+    def run_pickup_sequence(self, pickup_angles, update_status_callback, planned=None, pipelined=False):
+        self._run(self.driver.run_pickup_sequence(pickup_angles, update_status_callback,
+                                                  planned=planned, pipelined=pipelined))
+
+    def return_home(self, update_status_callback):
+        self._run(self.driver.return_home(update_status_callback))
+
+    def execute_plan(self, plan, update_status_callback):
+        self._run(self.driver.execute_plan(plan, update_status_callback))
+
+# TEACH AND REPLAY
+
+def record_trajectory(read_angles, clock=time.monotonic, sleep=time.sleep, stop=lambda: False,
+                      max_seconds=None, max_hz=TEACH_MAX_HZ):
+    """
+    Samples all six servos back to back, as fast as the bus answers (capped at max_hz),
+    until stop() returns True or max_seconds pass. Samples go into flat arrays, not
+    lists of lists, and a failed read repeats that joint's last good value.
+    Returns a Trajectory.
+    """
+    times = array('I')     # ms since the first sample
+    angles = array('h')    # 6 per sample
+    last = None
+    started = clock()
+    interval = 1.0 / max_hz if max_hz else 0.0
+
+    while not stop():
+        sample_time = clock()
+        if max_seconds is not None and sample_time - started > max_seconds:
+            break
+        reading = read_angles()
+        if last is None:
+            # Nothing to fall back on until one read comes back complete
+            if None not in reading:
+                last = list(reading)
         else:
-            print(f"[SIM] Gripper set to {angle}")
-            time.sleep(0.5)
+            last = [old if new is None else new for old, new in zip(last, reading)]
+        if last is not None:
+            times.append(int((sample_time - started) * 1000))
+            angles.extend(last)
+        remaining = interval - (clock() - sample_time)
+        if remaining > 0:
+            sleep(remaining)
 
-    def run_pickup_sequence(self, pickup_angles, update_status_callback):
-        
-        # Executes the pickup logic using the specific pickup_angles passed in.
-        
-        # 1. Start from Home
-        update_status_callback("Moving Home...")
-        self.move_arm(POS_HOME, MOVE_TIME)
-        self.set_gripper(GRIPPER_OPEN)
-
-        # 2. Move to Fruit Position
-        target_pos = list(pickup_angles)
-        target_pos[5] = GRIPPER_OPEN 
-        
-        update_status_callback(f"Reaching for fruit...")
-        self.move_arm(target_pos, MOVE_TIME)
-        
-        # 3. Grab
-        update_status_callback("Grabbing...")
-        self.set_gripper(GRIPPER_CLOSE)
+    return Trajectory(np.frombuffer(times, dtype=np.uint32), np.frombuffer(angles, dtype=np.int16))
 
-        # 4. Lift Up 
-        base_angle = pickup_angles[0]
-        pos_lift = [base_angle, 130, 30, 0, 90, GRIPPER_CLOSE]
-        
-        update_status_callback("Lifting fruit...")
-        self.move_arm(pos_lift, MOVE_TIME)
+def simplify_path(points, tolerance=TEACH_SIMPLIFY_TOLERANCE):
+    """
+    Ramer-Douglas-Peucker in joint space. Returns the indices of the samples to keep
+    so that straight joint-space moves between them (which is how the servos move)
+    never stray more than tolerance degrees from the recorded path.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    count = len(points)
+    if count < 3:
+        return np.arange(count)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, direction = points[first], points[last] - points[first]
+        inner = points[first + 1:last] - start
+        length_sq = float(direction @ direction)
+        t = np.clip(inner @ direction / length_sq, 0.0, 1.0) if length_sq else np.zeros(len(inner))
+        distances = np.linalg.norm(inner - t[:, None] * direction, axis=1)
+        worst = int(np.argmax(distances))
+        if distances[worst] > tolerance:
+            split = first + 1 + worst
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+class Trajectory:
+    """
+    A hand-taught path: sample times (uint32 ms) and servo angles (int16, 6 per
+    sample), plus the simplified waypoints replay uses. Saved as one compressed .npz.
+    """
+    def __init__(self, time_ms, angles, keep=None, tolerance=TEACH_SIMPLIFY_TOLERANCE):
+        self.time_ms = np.asarray(time_ms, dtype=np.uint32)
+        self.angles = np.asarray(angles, dtype=np.int16).reshape(-1, 6)
+        self.tolerance = float(tolerance)  # Degrees, also how early replay may leave a waypoint
+        self.keep = simplify_path(self.angles, tolerance) if keep is None else np.asarray(keep)
 
-        # 5. Move to Drop Zone
-        update_status_callback("Moving to drop zone...")
-        drop_pos_closed = list(POS_DROP)
+    @property
+    def waypoints(self):
+        return self.angles[self.keep]
+
+    @property
+    def duration(self):
+        return float(self.time_ms[-1]) / 1000.0 if len(self.time_ms) else 0.0
+
+    def save(self, path):
+        np.savez_compressed(path, time_ms=self.time_ms, angles=self.angles, keep=self.keep,
+                            tolerance=self.tolerance)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            tolerance = float(data['tolerance']) if 'tolerance' in data else TEACH_SIMPLIFY_TOLERANCE
+            return cls(data['time_ms'], data['angles'], data['keep'], tolerance)
+
+    def plan(self, start_angles=None, keep_timing=False):
+        """
+        Steps that replay the waypoints. By default each move is velocity-scaled like
+        planned pickups and blends through the waypoint, so the replay is smoother and
+        usually faster than the hand motion; keep_timing=True uses the recorded timing.
+        Blends leave a waypoint only within the simplify tolerance (not BLEND_TOLERANCE),
+        but never inside POSITION_TOLERANCE, which a servo may not get closer than.
+        simplify_path bounds the distance over all joints together while arrival is
+        checked per joint, so the arm can be up to sqrt(6) times the tolerance from a
+        waypoint (every joint at the limit) when it moves on.
+        """
+        times = self.time_ms[self.keep]
+        plan = []
+        previous = start_angles
+        last_index = len(self.keep) - 1
+        tolerance = max(self.tolerance, POSITION_TOLERANCE)
+        for i, target in enumerate(self.waypoints.tolist()):
+            if keep_timing and i > 0:
+                duration = max(MIN_MOVE_TIME, int(times[i] - times[i - 1]))
+            elif previous is None:
+                duration = MOVE_TIME
+            else:
+                duration = segment_duration(previous, target)
+            # Stop at the start of the path and at its end, flow through the rest
+            blend = 0 < i < last_index
+            plan.append(Step('move', target, duration, blend, "Replaying path..." if i == 0 else None, 'replay',
+                             tolerance))
+            previous = target
+        return plan
+
+def load_taught_stations(path=STATIONS_PATH):
+    """{fruit: angles} saved by TrajectoryRecorder.py, {} when nothing was taught."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_taught_station(fruit, angles, path=STATIONS_PATH):
+    stations = load_taught_stations(path)
+    stations[fruit] = [int(a) for a in angles]
+    with open(path, 'w') as f:
+        json.dump(stations, f, indent=2)
+
+# Taught stations win over the defaults at the top of the file
+_taught = load_taught_stations()
+if _taught:
+    print(f"Using taught stations for: {', '.join(sorted(_taught))}")
+    FRUIT_STATIONS.update(_taught)
+
+# ORDER QUEUE
+
+def plan_next_pick(fruit_name, start_pose, pipelined=PIPELINED_PICKS):
+    """The plan the queue would run for this fruit starting from start_pose."""
+    return plan_pickup(FRUIT_STATIONS[fruit_name], start_angles=start_pose, planned=PLANNED_TRAJECTORIES,
+                       start_home=not pipelined, end_home=not pipelined)
+
+def estimate_pick_time(fruit_name, start_pose=None):
+    """Planned seconds for one pickup, used for the ETA."""
+    if start_pose is None:
+        start_pose = POS_DROP if PIPELINED_PICKS else POS_HOME
+    plan = plan_next_pick(fruit_name, start_pose)
+    return sum(step.duration for step in plan) / 1000.0
+
+def order_picks(fruits, start_pose=POS_HOME, end_pose=POS_HOME):
+    """
+    Orders a basket to minimise total joint travel. Every pick starts and ends at the
+    same pose (POS_DROP when pipelined, POS_HOME otherwise), so only the first leg
+    (start_pose -> first station) and the last leg (last pick -> end_pose) depend on
+    the order. Those two stations are chosen with one plan per kind, the rest keep the
+    order they were added in. Repeats of the same fruit are picked back to back.
+    """
+    counts = Counter(fruits)
+    kinds = list(counts)
+    if len(kinds) <= 1:
+        return list(fruits)
+
+    steady = POS_DROP if PIPELINED_PICKS else POS_HOME
+    # Seconds saved by being first (reached from start_pose) or last (leaving for end_pose)
+    first = min(kinds, key=lambda kind: estimate_pick_time(kind, start_pose) - estimate_pick_time(kind, steady))
+    kinds.remove(first)
+    last = min(kinds, key=lambda kind: segment_duration(plan_next_pick(kind, steady)[-1].angles, end_pose))
+    kinds.remove(last)
+    return [fruit for kind in [first] + kinds + [last] for fruit in [kind] * counts[kind]]
+
+class OrderQueue:
+    """
+    Background pick queue so customers can keep adding fruit while the arm works.
+    Only the first pick out of a rest pose depends on the order (see order_picks);
+    in the middle of a run the basket is picked in the order it was added.
+    """
+    def __init__(self, pick_fn, on_change=None, idle_fn=None, pose_fn=None):
+        self.pick_fn = pick_fn          # Called on the worker thread with one fruit name
+        self.on_change = on_change      # Called whenever depth / ETA changes
+        self.idle_fn = idle_fn          # Called on the worker thread when the queue runs dry
+        self.pose_fn = pose_fn          # Where the arm is now, for ordering
+        self.cond = threading.Condition()
+        self.pending = []
+        self.current = None
+        self.current_started = 0.0
+        self.last_fruit = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def add(self, fruits):
+        with self.cond:
+            self.pending.extend(fruits)
+            self.cond.notify_all()
+        self._changed()
+
+    def clear(self):
+        with self.cond:
+            self.pending = []
+        self._changed()
+
+    def depth(self):
+        """Fruit still to pick, including the one in progress."""
+        with self.cond:
+            return len(self.pending) + (1 if self.current else 0)
+
+    def eta(self):
+        """Seconds until the whole queue is done."""
+        with self.cond:
+            pending = list(self.pending)
+            current = self.current
+            started = self.current_started
+        seconds = sum(estimate_pick_time(fruit) for fruit in pending)
+        if current:
+            seconds += max(estimate_pick_time(current) - (time.time() - started), 0.0)
+        return seconds
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change()
+
+    def _worker_loop(self):
+        while self.running:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or not self.running)
+                if not self.running:
+                    break
+                pending = list(self.pending)
+
+            # Finish a run of the same fruit first. From the pose every pick ends at the
+            # order makes no difference, so only a fresh start is planned (on a copy,
+            # without holding the lock the GUI needs).
+            pose = (self.pose_fn() if self.pose_fn else None) or POS_HOME
+            steady = POS_DROP if PIPELINED_PICKS else POS_HOME
+            if self.last_fruit in pending:
+                fruit = self.last_fruit
+            elif pose[:5] == steady[:5]:
+                fruit = pending[0]
+            else:
+                fruit = order_picks(pending, pose)[0]
+
+            with self.cond:
+                # clear() or stop() may have run while planning
+                if not self.running or fruit not in self.pending:
+                    continue
+                self.pending.remove(fruit)
+                self.last_fruit = fruit
+                self.current = fruit
+                self.current_started = time.time()
+            self._changed()
+
+            try:
+                self.pick_fn(fruit)
+            finally:
+                with self.cond:
+                    self.current = None
+                    idle = not self.pending
+                self._changed()
+
+            # Nothing queued behind this pick: let the arm go home
+            if idle and self.idle_fn:
+                self.idle_fn()
+
+    def stop(self):
+        """Drops pending orders. A pick already in progress is allowed to finish."""
+        with self.cond:
+            self.running = False
+            self.pending = []
+            self.cond.notify_all()
+
+# GUI EVENT BUS
+
+class GuiEventBus:
+    """
+    Carries updates from worker threads to the front-end's loop (the Tk loop is the
+    only thread allowed to touch widgets and Tk variables). post() works from any
+    thread; the loop calls drain() once per tick and applies one merged dict.
+    The newest value per key wins, so a burst of status changes costs one Tk update.
+    Keys in ADDITIVE are summed instead (a charge must never be lost).
+    """
+    ADDITIVE = {'charge'}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.posted = 0    # Events posted since the last drain, for the metrics
+
+    def post(self, key, value=None):
+        with self.lock:
+            if key in self.ADDITIVE:
+                self.pending[key] = self.pending.get(key, 0) + value
+            else:
+                self.pending[key] = value
+            self.posted += 1
+
+    def drain(self):
+        """Returns {key: value} for everything posted since the last drain."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            posted, self.posted = self.posted, 0
+        if posted:
+            METRICS.set_value('gui_events_coalesced', posted - len(pending))
+        return pending
+
+# MARKET SESSION
+
+class MarketSession:
+    """
+    Everything behind a front-end: camera, detection, tracking, the order queue and
+    the bill. There is no Tk in here, so the Tk GUI and the web front-end share it.
+    Worker threads only post to self.events, the front-end's loop applies them.
+    """
+    def __init__(self, arm_controller):
+        self.arm_controller = arm_controller
+        self.total_cost = 0
+
+        # Worker threads post status / cost changes here, the front-end's loop applies them
+        self.events = GuiEventBus()
+
+        # Camera -> table mapping for vision-guided picking
+        self.calibration = TableCalibration() if VISION_GUIDED_PICKING else None
+        if VISION_GUIDED_PICKING and check_kinematics() > KINEMATICS_TOLERANCE:
+            print(f"WARNING: Kinematic model is {check_kinematics():.3f} m off the calibrated stations, "
+                  "vision targets will fall back to FRUIT_STATIONS until Test/arm/FitKinematics.py passes")
+
+        # Clicks go into a queue, the arm works through it in the background
+        self.order_queue = OrderQueue(self.pick_logic, on_change=self.queue_changed,
+                                      idle_fn=self.queue_idle, pose_fn=lambda: arm_controller.pose).start()
         
-        drop_pos_closed[5] = GRIPPER_CLOSE
-        self.move_arm(drop_pos_closed, MOVE_TIME) 
+        #  AI / Video Setup
+        self.model = None
+        self.model_state = 'off'
+        self.pipeline = None
+        self.inference_worker = None
+        if PIPELINE_MODE == 'processes':
+            # Camera and YOLO run in their own processes, frames arrive through shared memory
+            print("Starting capture and inference processes...")
+            self.pipeline = ProcessPipeline().start()
+            self.grabber = self.pipeline
+            self.inference_worker = self.pipeline
+        else:
+            # The camera opens and reads on its own thread, the GUI just takes the newest frame.
+            # Probing a missing camera takes seconds, the window is up in the meantime.
+            self.grabber = FrameGrabber().start()
 
-        # 6. Drop
-        update_status_callback("Dropping fruit...")
-        self.set_gripper(GRIPPER_OPEN)
+            # The model loads and warms up in the background while the feed is already showing
+            self.model_state = 'loading'
+            threading.Thread(target=self.load_model, daemon=True).start()
+        self.last_seq = 0
+        self.last_detections = empty_detections() # Newest DETECTION_DTYPE array from the worker
+        self.tracker = Tracker()
+        self.last_result_seq = 0
+        self.first_frame_shown = False
 
-        # 7. Return Home
-        update_status_callback("Returning Home...")
-        self.move_arm(POS_HOME, MOVE_TIME)
-        update_status_callback("Ready")
+    def load_model(self):
+        """Background thread: loads and warms up the model, then starts detection on the live feed."""
+        try:
+            print("Loading YOLO model...")
+            model = Detector(MODEL_PATH)
+            model.warmup()
+            if COLOR_CASCADE:
+                model = CascadeDetector(model)
+        except Exception as e:
+            print(f"Error loading model: {e}")
+            print("WARNING: Running without AI detection.")
+            self.model_state = 'failed'
+            return
+        record_model_load(model)
+
+        # The user may have finished while the model was loading
+        if not self.grabber.running:
+            return
+        self.model = model
+        motion_gate = MotionGate() if MOTION_GATE else None
+        # OPTIMISATION 
+        # Detection runs on its own thread, the GUI redraws the latest boxes on every frame
+        self.inference_worker = InferenceWorker(self.grabber, model, motion_gate=motion_gate,
+                                                imgsz_controller=imgsz_controller_for(model)).start()
+        self.model_state = 'ready'
+
+    def order(self, fruits):
+        """Adds fruit to the basket. Ordering after an emergency stop lets the arm move again."""
+        self.arm_controller.resume()
+        self.order_queue.add(fruits)
+
+    def emergency_stop(self):
+        """Holds the arm where it is and drops the queued picks, safe from any thread."""
+        self.order_queue.clear()
+        self.arm_controller.emergency_stop()
+        self.update_status("EMERGENCY STOP - order again to resume")
+
+    def queue_changed(self):
+        # Called from the queue worker too, the front-end refreshes its queue display
+        self.events.post('queue')
+
+    def locate_fruit(self, fruit_name):
+        """
+        Where the camera last saw fruit_name, as ('found', (x, y, z)), ('missing', None)
+        when a trustworthy frame shows no such fruit, or ('unknown', None) when vision
+        cannot tell (no model, no calibration, stale detections, camera off the scan pose).
+        """
+        if not (self.calibration and self.calibration.ready and self.inference_worker):
+            return 'unknown', None
+
+        _, result_time, detections = self.inference_worker.latest_result()
+        if time.time() - result_time > DETECTION_MAX_AGE:
+            return 'unknown', None
+        if CAMERA_ON_ARM:
+            home_since = self.arm_controller.home_since
+            if home_since is None or result_time < home_since + SCAN_SETTLE_TIME:
+                return 'unknown', None
+
+        grasp = select_grasp(detections, self.inference_worker.names, fruit_name)
+        if grasp is None:
+            return 'missing', None
+        x, y = self.calibration.pixel_to_table([grasp])[0]
+        return 'found', (float(x), float(y), GRASP_HEIGHT)
+
+    def pick_logic(self, fruit_name):
+        """Picks one fruit, runs on the order queue's worker thread."""
+        try:
+            print(f"Starting sequence for {fruit_name}")
+
+            # Check the camera first so an empty station costs neither money nor a cycle
+            found, target = self.locate_fruit(fruit_name) if VISION_GUIDED_PICKING else ('unknown', None)
+            if found == 'missing':
+                self.update_status(f"No {fruit_name} in view, skipped")
+                return
+
+            angles = FRUIT_STATIONS[fruit_name]
+            if found == 'found':
+                try:
+                    angles = self.arm_controller.angles_for_xyz(target)
+                    print(f"Vision target for {fruit_name}: {target}")
+                except ValueError as e:
+                    print(f"{e}, using the calibrated station")
+            
+            # Add to cost, total_cost itself is only changed by the front-end's loop
+            self.events.post('charge', FRUIT_PRICES.get(fruit_name, 0))
+            self.update_status(f"Picking {fruit_name}...")
+            
+            self.arm_controller.run_pickup_sequence(angles, self.update_status, pipelined=PIPELINED_PICKS)
+            
+        except EmergencyStop:
+            print(f"Emergency stop while picking {fruit_name}")
+        except Exception as e:
+            print(f"Error in pick thread: {e}")
+            self.update_status(f"Error: {e}")
+
+    def queue_idle(self):
+        """Queue ran dry, end the run of pipelined picks at home."""
+        if self.arm_controller.stopped:
+            return  # Stay put after an emergency stop, the next order homes first
+        try:
+            self.arm_controller.return_home(self.update_status)
+        except Exception as e:
+            print(f"Error returning home: {e}")
+            self.update_status(f"Error: {e}")
+
+    def update_status(self, text):
+        # Safe from any thread, only the newest status per front-end tick is shown
+        self.events.post('status', text)
+
+    def annotate(self, frame):
+        """
+        Tracks the newest detections and draws them on a copy of frame, returns the copy.
+        Called by the front-end's loop for every new frame.
+        """
+        # The grabber (or shared-memory ring) shares this array, draw on our own copy
+        frame = frame.copy()
+
+        # 1. Pick up the newest detections published by the inference worker
+        with METRICS.timer('track'):
+            if self.inference_worker:
+                result_seq, result_time, detections = self.inference_worker.latest_result()
+                if result_seq != self.last_result_seq:
+                    self.last_result_seq = result_seq
+                    self.last_detections = detections
+                    self.tracker.update(detections, result_time)
+            tracks = self.tracker.predict(time.time())
+
+        # 2. Draw the tracked boxes on EVERY frame, moved to where they should be now
+        with METRICS.timer('draw'):
+            draw_tracks(frame, tracks, self.inference_worker.names if self.inference_worker else {})
+        return frame
+
+    def model_status(self):
+        """'loading', 'ready', 'failed' or 'off'."""
+        return self.pipeline.state if self.pipeline else self.model_state
+
+    def stop_video(self):
+        if self.pipeline:
+            self.pipeline.stop()
+            return
+        if self.inference_worker:
+            self.inference_worker.stop()
+        self.grabber.stop()
+        cap = self.grabber.cap
+        if cap is not None and cap.isOpened():
+            cap.release()
 
 # GUI APPLICATION
 
-class DofMarketApp:
+class DofMarketApp(MarketSession):
     def __init__(self, root, arm_controller):
         self.root = root
         self.root.title("DofMarket")
@@ -136,10 +2615,9 @@ class DofMarketApp:
         center_y = int(screen_height/2 - window_height/2)
         self.root.geometry(f'{window_width}x{window_height}+{center_x}+{center_y}')
         
-        self.arm_controller = arm_controller
-        self.is_busy = False # Lock to prevent double clicking
-        self.total_cost = 0
-        
+        super().__init__(arm_controller)
+        self.last_stats_time = 0
+
         # Theme Config
         self.bg_color = "#2c2c2c"
         self.panel_color = "#383838"
@@ -148,30 +2626,6 @@ class DofMarketApp:
         
         self.root.configure(bg=self.bg_color)
 
-        #  AI / Video Setup
-        self.model = None  
-        try:
-            print("Loading YOLO model...")
-            self.model = YOLO(MODEL_PATH)
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            print("WARNING: Running without AI detection.")
-            
-
-        self.cap = cv2.VideoCapture(CAMERA_INDEX)
-        
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        self.cap.set(cv2.CAP_PROP_BRIGHTNESS, 30)
-        self.cap.set(cv2.CAP_PROP_EXPOSURE, -5)
-        self.cap.set(cv2.CAP_PROP_CONTRAST, 30)
-
-        # OPTIMISATION 
-        self.SKIP_FRAMES = 30
-        self.frame_count = 0
-        self.last_detections = [] # Stores (box_coords, label) tuples
-
-        
         #  GUI Layout 
         
         # Left Side: Video Feed
@@ -180,6 +2634,7 @@ class DofMarketApp:
         
         self.video_label = tk.Label(self.video_frame, bg="black")
         self.video_label.pack()
+        self.renderer = FrameRenderer()
 
         # Right Side: Controls
         self.control_panel = tk.Frame(root, width=300, bg=self.panel_color)
@@ -196,6 +2651,13 @@ class DofMarketApp:
                                      font=("Arial", 14), bg=self.panel_color, fg="#00ff00")
         self.status_label.pack(pady=10)
 
+        # Queue Label
+        self.queue_var = tk.StringVar()
+        self.queue_var.set("Queue: 0")
+        self.queue_label = tk.Label(self.control_panel, textvariable=self.queue_var,
+                                    font=("Arial", 12), bg=self.panel_color, fg=self.text_color)
+        self.queue_label.pack(pady=5)
+
         # Total Cost Label
         self.cost_var = tk.StringVar()
         self.cost_var.set("Total Cost: Rs 0")
@@ -231,6 +2693,10 @@ class DofMarketApp:
             self.buttons[fruit_name] = btn
 
         # Stop Button
+        tk.Button(self.control_panel, text="EMERGENCY STOP", bg="#b00020", fg="white", activebackground="#7f0017",
+                  activeforeground="white", font=("Arial", 14, "bold"), width=20, height=2,
+                  command=self.emergency_stop).pack(pady=10)
+
         # Bottom Controls (Reset & Exit)
         self.bottom_controls = tk.Frame(self.control_panel, bg=self.panel_color)
         self.bottom_controls.pack(side=tk.BOTTOM, pady=20, fill=tk.X)
@@ -245,16 +2711,18 @@ class DofMarketApp:
                   command=self.on_close).pack(side=tk.RIGHT, padx=10, expand=True)
 
         # Start Loops 
-        self.prev_frame_time = 0
+        record_startup('window')
         self.update_video()
 
     def show_checkout_screen(self):
        
-        self.is_busy = True # Stop any arm threads if possible
+        # Drop queued picks, one already in progress finishes on its own
+        self.order_queue.stop()
+        # A charge posted moments ago must make it onto the bill
+        self.apply_events()
         
         # Stop video
-        if self.cap.isOpened():
-            self.cap.release()
+        self.stop_video()
             
         # Clear all widgets
         for widget in self.root.winfo_children():
@@ -285,117 +2753,74 @@ class DofMarketApp:
 
     def reset_cost(self):
         """Resets the total cost to 0."""
+        # A charge posted just before the click belongs to the bill being reset
+        self.apply_events()
         self.total_cost = 0
         self.cost_var.set("Total Cost: Rs 0")
         self.status_var.set("Cost Reset")
 
     def start_pick_thread(self, fruit_name):
-        
-        if self.is_busy:
-            messagebox.showwarning("Busy", "Arm is currently moving! Please wait.")
-            return
-
-        self.is_busy = True
-        self.disable_buttons()
-        
-        # Create a thread for the blocking arm logic
-        threading.Thread(target=self.pick_logic, args=(fruit_name,), daemon=True).start()
+        # Never blocks: the fruit joins the basket and the queue worker picks it up
+        self.order([fruit_name])
 
-    def pick_logic(self, fruit_name):
-        """The actual logic running in the background thread."""
-        try:
-            print(f"Starting sequence for {fruit_name}")
-            
-            # Add to cost
-            price = FRUIT_PRICES.get(fruit_name, 0)
-            self.total_cost += price
-            self.status_var.set(f"Picking {fruit_name}...")
-            # Schedule GUI update for cost in the main thread
-            self.root.after(0, lambda: self.cost_var.set(f"Total Cost: Rs {self.total_cost}"))
-
-            angles = FRUIT_STATIONS[fruit_name]
-            
-            self.arm_controller.run_pickup_sequence(angles, self.update_status)
-            
-        except Exception as e:
-            print(f"Error in pick thread: {e}")
-            self.update_status(f"Error: {e}")
-        finally:
-            self.is_busy = False
-            self.enable_buttons()
-
-    def update_status(self, text):
-        self.status_var.set(text)
-
-    def disable_buttons(self):
-        for btn in self.buttons.values():
-            btn.config(state=tk.DISABLED)
-
-    def enable_buttons(self):
-        # We need to use root.after because this might be called from the thread
-        self.root.after(0, self._enable_buttons_main_thread)
+    def refresh_queue_label(self):
+        depth = self.order_queue.depth()
+        if depth:
+            self.queue_var.set(f"Queue: {depth} | ETA: {self.order_queue.eta():.0f}s")
+        else:
+            self.queue_var.set("Queue: 0")
 
-    def _enable_buttons_main_thread(self):
-        for btn in self.buttons.values():
-            btn.config(state=tk.NORMAL)
+    def apply_events(self):
+        """Applies everything worker threads posted since the last tick, on the Tk thread."""
+        events = self.events.drain()
+        if 'charge' in events:
+            self.total_cost += events['charge']
+            self.cost_var.set(f"Total Cost: Rs {self.total_cost}")
+        if 'status' in events:
+            self.status_var.set(events['status'])
+        if 'queue' in events:
+            self.refresh_queue_label()
 
     def update_video(self):
         """
-        Captures frame, runs YOLO intermittently, and updates the GUI label.
-        Optimized to skip frames for detection but draw persisted boxes.
+        Takes the newest captured frame, draws the latest detections and updates the GUI label.
+        Detection itself runs on the InferenceWorker thread so it never blocks the UI.
         """
-        ret, frame = self.cap.read()
+        # Status, cost and queue changes from the worker threads, merged into one update
+        self.apply_events()
+
+        seq, frame = self.grabber.latest()
         
-        if ret:
-            # 1. Run heavy detection every SKIP_FRAMES
-            if self.model and (self.frame_count % self.SKIP_FRAMES == 0):
-                # Run inference with stream=True for speed, smaller img size
-                results = self.model(frame, conf=0.2, imgsz=640, stream=True, verbose=False)
-                
-                # Reset detections list
-                self.last_detections = []
-                
-                # Process results
-                for r in results:
-                    boxes = r.boxes
-                    for box in boxes:
-                        # Coordinates
-                        b = box.xyxy[0].cpu().numpy().astype(int)
-                        # Class & Confidence
-                        cls = int(box.cls[0])
-                        conf = float(box.conf[0])
-                        
-                        label_text = f"{self.model.names[cls]} {conf:.2f}"
-                        self.last_detections.append((b, label_text))
-            
-            # 2. Draw the saved boxes on EVERY frame
-            for (b, label_text) in self.last_detections:
-                x1, y1, x2, y2 = b
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, label_text, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 
-                            0.5, (0, 255, 0), 2)
-
-            self.frame_count += 1
-
-            # 3. Calculate FPS
-            new_frame_time = time.time()
-            if new_frame_time - self.prev_frame_time > 0:
-                fps = 1 / (new_frame_time - self.prev_frame_time)
-            else:
-                fps = 0
-            self.prev_frame_time = new_frame_time
-            self.fps_var.set(f"FPS: {int(fps)}")
+        # Only render when the capture thread has produced a new frame
+        if frame is not None and seq != self.last_seq:
+            self.last_seq = seq
+            frame_start = time.perf_counter()
 
-            # 4. Convert image for Tkinter (OpenCV BGR -> PIL RGB -> ImageTk)
-            rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(rgb_image)
-            
-            # Resize 
-            img = img.resize((640, 480), Image.Resampling.LANCZOS)
-            
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.video_label.imgtk = imgtk
-            self.video_label.configure(image=imgtk)
+            # 1-2. Track and draw the latest detections on our own copy
+            frame = self.annotate(frame)
+
+            # 3. Push the frame into the reused Tk image (BGR -> RGB happens while unpacking)
+            self.renderer.render(frame, self.video_label)
+
+            METRICS.record('frame', time.perf_counter() - frame_start)
+            METRICS.tick('display')
+            if not self.first_frame_shown:
+                self.first_frame_shown = True
+                record_startup('first_frame')
+
+            # 4. Refresh the on-screen stats a couple of times per second, not every frame
+            if time.time() - self.last_stats_time > 0.5:
+                self.last_stats_time = time.time()
+                model_state = self.model_status()
+                ai = f"{METRICS.rate('detect'):.1f}/s" if model_state == 'ready' else model_state
+                self.fps_var.set(
+                    f"FPS: {METRICS.rate('display'):.1f} | AI: {ai}\n"
+                    f"Infer p50/p95: {METRICS.percentile_ms('inference', 50):.0f}/"
+                    f"{METRICS.percentile_ms('inference', 95):.0f} ms\n"
+                    f"Frame p95: {METRICS.percentile_ms('frame', 95):.1f} ms"
+                )
+                # Lets the ETA count down while the arm is working
+                self.refresh_queue_label()
 
         # Schedule the next update (10ms = 100fps target for GUI refresh)
         self.root.after(10, self.update_video)
@@ -403,16 +2828,331 @@ class DofMarketApp:
     def on_close(self):
         # Cleanup resources
         print("Closing application...")
-        if self.cap.isOpened():
-            self.cap.release()
+        self.order_queue.stop()
+        self.stop_video()
         self.root.destroy()
         sys.exit()
 
 
+# WEB FRONT-END
+
+# Thin client served at /, everything it shows comes from /stream and /api/state
+WEB_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>DofMarket</title>
+<style>
+body { background: #2c2c2c; color: #fff; font-family: Arial, sans-serif; display: flex; margin: 10px; }
+#panel { background: #383838; flex: 1; margin-left: 10px; padding: 10px; text-align: center; }
+button { display: block; width: 220px; margin: 6px auto; padding: 12px; font-size: 16px; color: #fff;
+         background: #4a90e2; border: 0; }
+#status { color: #0f0; font-size: 18px; } #cost { color: #ffd700; font-size: 20px; font-weight: bold; }
+</style></head>
+<body><img src="/stream" width="640" height="480">
+<div id="panel"><h2>Fruit Selection</h2><p id="status"></p><p id="queue"></p><p id="cost"></p>
+<div id="fruits"></div>
+<button style="background: #b00020; font-weight: bold" onclick="post('/api/stop', {})">EMERGENCY STOP</button>
+<button style="background: orange" onclick="post('/api/reset', {})">RESET COST</button>
+<button style="background: #28a745" onclick="finish()">FINISH</button></div>
+<script>
+function post(url, body) {
+  return fetch(url, {method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(body)})
+    .then(r => r.json()).then(show);
+}
+function show(s) {
+  if (s.status === undefined) return;
+  document.getElementById('status').textContent = s.status;
+  document.getElementById('queue').textContent = 'Queue: ' + s.queue + (s.queue ? ' | ETA: ' + Math.round(s.eta_s) + 's' : '');
+  document.getElementById('cost').textContent = 'Total Cost: Rs ' + s.total_cost;
+}
+function finish() {
+  fetch('/api/finish', {method: 'POST', headers: {'Content-Type': 'application/json'}, body: '{}'}).then(r => r.json()).then(b => alert('Total Amount: Rs ' + b.total));
+}
+fetch('/api/state').then(r => r.json()).then(s => {
+  for (const [fruit, price] of Object.entries(s.prices)) {
+    const b = document.createElement('button');
+    b.textContent = 'Pick ' + fruit + ' (Rs ' + price + ')';
+    b.onclick = () => post('/api/buy', {fruit: fruit});
+    document.getElementById('fruits').appendChild(b);
+  }
+  show(s);
+});
+setInterval(() => fetch('/api/state').then(r => r.json()).then(show), 500);
+</script></body></html>
+"""
+
+class WebFrontend(MarketSession):
+    """
+    Headless front-end (python3 DofMarket.py --web) with no Tk window and no PIL.
+    The annotated feed is JPEG-encoded once per frame, only while someone is watching,
+    and the same bytes go to every /stream client. Buy / stop / reset / finish are a
+    small JSON API on the same order queue and arm controller as the Tk GUI.
+    """
+    def __init__(self, arm_controller, host=WEB_HOST, port=WEB_PORT):
+        super().__init__(arm_controller)
+        self.host = host
+        self.port = port
+        self.status = "System Ready"
+        self.lock = threading.RLock()       # total_cost and status, HTTP threads read them
+        self.cond = threading.Condition()   # Wakes /stream clients when a new JPEG is ready
+        self.jpeg = None
+        self.jpeg_seq = 0
+        self.viewers = 0
+        self.running = False
+        self.server = None
+
+    def serve_forever(self):
+        self.running = True
+        threading.Thread(target=self._frame_loop, daemon=True).start()
+        self.server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.server.daemon_threads = True
+        print(f"DofMarket web front-end on http://{self.host}:{self.port}/")
+        record_startup('window')
+        try:
+            self.server.serve_forever()
+        finally:
+            self.stop()
+
+    def _frame_loop(self):
+        while self.running:
+            # Status and charges from the worker threads, merged once per frame
+            self.apply_events()
+
+            seq, frame = self.grabber.wait_next(self.last_seq, timeout=0.1)
+            if frame is None or seq == self.last_seq:
+                continue
+            self.last_seq = seq
+            # Nobody watching: no drawing and no encoding, the CPU goes to inference
+            if not self.viewers:
+                continue
+
+            frame_start = time.perf_counter()
+            frame = self.annotate(frame)
+            with METRICS.timer('encode'):
+                ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, WEB_JPEG_QUALITY])
+            if not ok:
+                continue
+            with self.cond:
+                self.jpeg = jpeg.tobytes()
+                self.jpeg_seq = seq
+                self.cond.notify_all()
+
+            METRICS.record('frame', time.perf_counter() - frame_start)
+            METRICS.tick('display')
+            if not self.first_frame_shown:
+                self.first_frame_shown = True
+                record_startup('first_frame')
+
+    def wait_jpeg(self, last_seq, timeout=1.0):
+        """Blocks until a JPEG newer than last_seq exists, returns (seq, jpeg bytes) or (last_seq, None)."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.jpeg_seq > last_seq or not self.running, timeout)
+            if self.jpeg_seq > last_seq:
+                return self.jpeg_seq, self.jpeg
+            return last_seq, None
+
+    def add_viewer(self, count):
+        with self.cond:
+            self.viewers += count
+
+    def apply_events(self):
+        """Applies everything worker threads posted, from whichever thread asks first."""
+        # Drained under the lock so two HTTP threads can't apply statuses out of order
+        with self.lock:
+            events = self.events.drain()
+            if 'charge' in events:
+                self.total_cost += events['charge']
+            if 'status' in events:
+                self.status = events['status']
+
+    def state(self):
+        self.apply_events()
+        with self.lock:
+            return {
+                'status': self.status,
+                'total_cost': self.total_cost,
+                'queue': self.order_queue.depth(),
+                'eta_s': round(self.order_queue.eta(), 1),
+                'ai': self.model_status(),
+                'prices': FRUIT_PRICES,
+            }
+
+    def buy(self, fruits):
+        self.order(fruits)
+        return self.state()
+
+    def stop_arm(self):
+        self.emergency_stop()
+        return self.state()
+
+    def reset_cost(self):
+        with self.lock:
+            self.apply_events()
+            self.total_cost = 0
+            self.status = "Cost Reset"
+        return self.state()
+
+    def finish(self):
+        """
+        Checkout for one customer. Queued picks are dropped (one in progress finishes)
+        and the bill starts again from zero for the next customer.
+        """
+        self.order_queue.clear()
+        with self.lock:
+            self.apply_events()
+            total = self.total_cost
+            self.total_cost = 0
+            self.status = "Thank you for your purchase!"
+        return {'total': total}
+
+    def _handler(self):
+        frontend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/':
+                    self._send(200, 'text/html; charset=utf-8', WEB_PAGE.encode())
+                elif path == '/stream':
+                    self._stream()
+                elif path == '/frame.jpg':
+                    self._snapshot()
+                elif path == '/api/state':
+                    self._json(200, frontend.state())
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                path = self.path.split('?')[0]
+                # Checked before reading, a bad length would block or buffer the whole body.
+                # The body stays unread on refusal, so the connection can't be reused.
+                length = self.headers.get('Content-Length')
+                if length is None:
+                    self.close_connection = True
+                    self._json(411, {'error': 'Content-Length required'})
+                    return
+                try:
+                    length = int(length)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    self.close_connection = True
+                    self._json(400, {'error': 'Content-Length must be a non-negative integer'})
+                    return
+                if length > WEB_MAX_BODY:
+                    self.close_connection = True
+                    self._json(413, {'error': f'Body larger than {WEB_MAX_BODY} bytes'})
+                    return
+                data = self.rfile.read(length)
+                # These move the arm and change the bill. A cross-origin page can only send
+                # application/json after a CORS preflight, which this server never grants.
+                if self.headers.get_content_type() != 'application/json':
+                    self._json(415, {'error': 'Content-Type must be application/json'})
+                    return
+                try:
+                    body = json.loads(data or b'{}')
+                except ValueError:
+                    body = None
+                if not isinstance(body, dict):
+                    self._json(400, {'error': 'Body must be a JSON object'})
+                    return
+
+                if path == '/api/buy':
+                    fruits = body.get('fruits') or [body.get('fruit')]
+                    if not isinstance(fruits, list) or not all(isinstance(f, str) for f in fruits):
+                        self._json(400, {'error': "'fruits' must be a list of names"})
+                        return
+                    unknown = [f for f in fruits if f not in FRUIT_STATIONS]
+                    if unknown:
+                        self._json(400, {'error': f"Unknown fruit: {', '.join(map(str, unknown))}"})
+                        return
+                    self._json(200, frontend.buy(fruits))
+                elif path == '/api/stop':
+                    self._json(200, frontend.stop_arm())
+                elif path == '/api/reset':
+                    self._json(200, frontend.reset_cost())
+                elif path == '/api/finish':
+                    self._json(200, frontend.finish())
+                else:
+                    self.send_error(404)
+
+            def _stream(self):
+                # MJPEG: one multipart part per frame, every client gets the same encoded bytes
+                self.send_response(200)
+                self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                frontend.add_viewer(1)
+                seq = 0
+                try:
+                    while frontend.running:
+                        seq, jpeg = frontend.wait_jpeg(seq)
+                        if jpeg is None:
+                            continue
+                        self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\n'
+                                         b'Content-Length: %d\r\n\r\n' % len(jpeg))
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b'\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client went away
+                finally:
+                    frontend.add_viewer(-1)
+
+            def _snapshot(self):
+                frontend.add_viewer(1)
+                try:
+                    _, jpeg = frontend.wait_jpeg(frontend.jpeg_seq, timeout=2.0)
+                finally:
+                    frontend.add_viewer(-1)
+                if jpeg is None:
+                    self.send_error(503, "No camera frame yet")
+                    return
+                self._send(200, 'image/jpeg', jpeg)
+
+            def _json(self, code, payload):
+                self._send(code, 'application/json', json.dumps(payload).encode())
+
+            def _send(self, code, content_type, body):
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep the console clean
+
+        return Handler
+
+    def stop(self):
+        print("Closing application...")
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        self.order_queue.stop()
+        self.stop_video()
+        if self.server is not None:
+            self.server.server_close()
+            self.server = None
+
+
 if __name__ == "__main__":
+    # Before any thread starts, so they all stay on the GUI core
+    if PIPELINE_MODE == 'processes':
+        pin_to_cores(CPU_GUI, 'gui')
+
+    # Optional metrics log / local endpoint (see METRICS_LOG_PATH / METRICS_PORT)
+    MetricsExporter(METRICS).start()
+
     # Initialise Hardware
     bot_arm = RoboticArmController()
 
+    if '--web' in sys.argv:
+        # Headless: no Tk window, the kiosk display is a browser pointed at WEB_HOST:WEB_PORT
+        try:
+            WebFrontend(bot_arm).serve_forever()
+        except KeyboardInterrupt:
+            pass
+        sys.exit()
+
     # Initialise GUI
     root = tk.Tk()
     app = DofMarketApp(root, bot_arm)
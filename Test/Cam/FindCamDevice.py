@@ -1,14 +1,21 @@
 # Test Camera each time
-import cv2
+# Probes every index at once (like DofMarket.py does with CAMERA_SOURCE = 'auto')
+# and shows which low-latency mode each camera grants.
+import os
+import sys
+import time
 
-for i in range(5):  
-    cap = cv2.VideoCapture(i)
-    if cap.isOpened():
-        ret, frame = cap.read()
-        if ret:
-            print(" Camera found at index ", i)
-        else:
-            print(" Camera at index", i ,"opened but no frame captured")
-        cap.release()
-    else:
-        print("No camera at index", i)
\ No newline at end of file
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+import DofMarket as dm
+
+indices = range(10)
+started = time.perf_counter()
+found = dm.probe_cameras(indices)
+print(f"Probed indices 0-{indices[-1]} in {time.perf_counter() - started:.2f}s")
+
+if not found:
+    print("No camera found")
+for index, cap in found:
+    granted = dm.configure_camera(cap)
+    print(" Camera found at index ", index, granted)
+    cap.release()
@@ -1,18 +1,18 @@
 import os
+import sys
 from ultralytics import YOLO
 import cv2
 import time
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+import DofMarket as dm
+
 
 MODEL_PATH = '/home/pi/Documents/PythonCW/models/fruit.pt'
 model = YOLO(MODEL_PATH)
 
-# Open the webcam
-cap = cv2.VideoCapture(1)
-
-# Lower resolution for speed
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+# Open the webcam the app uses (cached / probed device, 640x480 low-latency mode)
+cap = dm.open_camera()
 
 SKIP_FRAMES = 30         
 frame_count = 0          
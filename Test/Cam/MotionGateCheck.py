@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+#coding=utf-8
+# Checks the MotionGate on synthetic frames: sensor noise must not wake YOLO,
+# adding or removing a single fruit cube must. Exits non-zero on failure.
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+import DofMarket as dm
+
+CUBE = 70  # Pixels, about the size of a fruit cube in a 640x480 frame
+
+
+def table(cubes, noise=0, seed=0):
+    """Grey table with (x, y, bgr) cubes and optional sensor noise."""
+    frame = np.full((480, 640, 3), 120, np.uint8)
+    for x, y, color in cubes:
+        frame[y:y + CUBE, x:x + CUBE] = color
+    if noise:
+        rng = np.random.default_rng(seed)
+        frame = np.clip(frame + rng.normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+    return frame
+
+
+def check(name, gate, frame, expected):
+    ran = gate.should_run(frame)
+    print(f"{name:<28} score {gate.last_score:.4f}  {'runs' if ran else 'skipped'}")
+    if ran != expected:
+        print(f"FAIL: {name} should have {'run' if expected else 'been skipped'}")
+        return 1
+    return 0
+
+
+def main():
+    apple = (300, 200, (30, 30, 200))
+    kiwi = (100, 250, (40, 160, 60))
+    failures = 0
+
+    gate = dm.MotionGate(max_age=60.0)
+    gate.should_run(table([apple, kiwi], noise=4, seed=1))
+    failures += check("Same scene, sensor noise", gate, table([apple, kiwi], noise=4, seed=2), False)
+    failures += check("One fruit removed", gate, table([apple], noise=4, seed=3), True)
+    failures += check("One fruit added back", gate, table([apple, kiwi], noise=4, seed=4), True)
+
+    if failures:
+        print(f"{failures} check(s) FAILED")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+#coding=utf-8
+# Fits the joint convention (JOINT_ZERO / JOINT_SIGN) of the kinematic model to the
+# stations the arm really grasps cubes at, then checks that forward kinematics puts
+# every station at table height. Exits non-zero when no convention does, in which
+# case vision-guided picking must stay off.
+#
+#   python3 FitKinematics.py            # FRUIT_STATIONS plus any taught in stations.json
+#   python3 FitKinematics.py --step 1   # finer search, slower
+import os
+import sys
+import argparse
+import itertools
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+import DofMarket as dm
+
+REST_CLEARANCE = 0.05  # Metres the gripper must stay above the table at POS_HOME and POS_DROP
+MIN_REACH = 0.10       # Metres, stations closer to the base axis would be inside the base
+CHUNK = 20000          # Conventions scored per numpy call
+
+
+def reachable(poses):
+    """Servo angles as the servos really take them (out-of-range commands are clamped)."""
+    return np.clip(np.asarray(poses, dtype=np.float64), 0, dm.SERVO_MAX_ANGLE)
+
+
+def joints_above_table(poses, zero, sign):
+    """(M,) True where elbow and wrist stay above the table in every pose."""
+    lean = np.cumsum(np.radians(sign * (poses[:, 1:4] - zero)), axis=-1)
+    elbow_z = dm.LINK_BASE + dm.LINK_UPPER * np.cos(lean[..., 0])
+    wrist_z = elbow_z + dm.LINK_FORE * np.cos(lean[..., 1])
+    return ((elbow_z > 0) & (wrist_z > 0)).all(axis=1)
+
+
+def fit(stations, step):
+    """Returns [(worst station error in metres, sign, zero)], best first, one row per sign."""
+    grid = np.arange(0, 181, step, dtype=np.float64)
+    zeros = np.stack(np.meshgrid(grid, grid, grid, indexing='ij'), axis=-1).reshape(-1, 3)
+    stations = reachable(stations)
+    rest = reachable([dm.POS_HOME, dm.POS_DROP])
+
+    rows = []
+    for sign in itertools.product([1, -1], repeat=3):
+        best = (np.inf, sign, None)
+        for i in range(0, len(zeros), CHUNK):
+            zero = zeros[i:i + CHUNK, None, :]
+            xyz, _ = dm.forward_kinematics(stations, zero, np.array(sign))
+            error = np.abs(xyz[..., 2] - dm.GRASP_HEIGHT).max(axis=1)
+            # Stations in front of the base, rest poses clear of the table, no joint through it
+            reach = np.hypot(xyz[..., 0], xyz[..., 1]) * np.sign(xyz[..., 1])
+            rest_xyz, _ = dm.forward_kinematics(rest, zero, np.array(sign))
+            plausible = ((reach > MIN_REACH).all(axis=1) & (rest_xyz[..., 2] > REST_CLEARANCE).all(axis=1)
+                         & joints_above_table(np.vstack([stations, rest]), zero, np.array(sign)))
+            error[~plausible] = np.inf
+            j = int(np.argmin(error))
+            if error[j] < best[0]:
+                best = (float(error[j]), sign, zeros[i + j].astype(int).tolist())
+        rows.append(best)
+    return sorted(rows, key=lambda row: row[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit JOINT_ZERO / JOINT_SIGN to the taught stations")
+    parser.add_argument('--step', type=float, default=2.0, help="search step in degrees")
+    args = parser.parse_args()
+
+    names = list(dm.FRUIT_STATIONS)
+    stations = [dm.FRUIT_STATIONS[name] for name in names]
+    current = dm.check_kinematics()
+    print(f"Current model (JOINT_ZERO={dm.JOINT_ZERO}, JOINT_SIGN={dm.JOINT_SIGN}): "
+          f"stations up to {current:.3f} m off GRASP_HEIGHT")
+
+    rows = fit(stations, args.step)
+    print(f"\n{'JOINT_SIGN':<16}{'JOINT_ZERO':<18}{'worst (m)':>10}")
+    for error, sign, zero in rows:
+        print(f"{str(list(sign)):<16}{str(zero):<18}{error:>10.3f}")
+
+    error, sign, zero = rows[0]
+    if zero is None or error > dm.KINEMATICS_TOLERANCE:
+        print(f"\nFAIL: no joint convention puts every station within {dm.KINEMATICS_TOLERANCE} m of the table "
+              f"while HOME / DROP stay {REST_CLEARANCE} m above it and no joint goes through the table.")
+        print("Re-teach the stations (TrajectoryRecorder.py station <fruit>) and run this again.")
+        sys.exit(1)
+
+    xyz, _ = dm.forward_kinematics(reachable(stations), np.array(zero), np.array(sign))
+    print()
+    for name, (x, y, z) in zip(names, xyz):
+        print(f"{name:<12} x {x:+.3f}  y {y:+.3f}  z {z:+.3f}")
+    print(f"\nSet in DofMarket.py:\nJOINT_ZERO = {zero}\nJOINT_SIGN = {list(sign)}")
+
+
+if __name__ == '__main__':
+    main()
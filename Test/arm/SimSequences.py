@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+#coding=utf-8
+# Runs many pickup sequences through the asyncio arm driver on a simulated arm
+# and virtual clock, then checks an emergency stop, directly and through
+# RoboticArmController. Exits non-zero on failure, so it can run in CI on any
+# Linux box (no Arm_Lib, no camera, no display).
+import os
+import sys
+import time
+import random
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+import DofMarket as dm
+
+SEQUENCES = 300
+
+
+def new_driver():
+    clock = dm.VirtualClock()
+    loop = dm.VirtualTimeLoop(clock)
+    driver = dm.AsyncArmDriver(dm.SimulatedArm(clock.now, verbose=False))
+    return loop, clock, driver
+
+
+def check_sequences(count):
+    loop, clock, driver = new_driver()
+    fruits = list(dm.FRUIT_STATIONS)
+    rng = random.Random(0)
+    failures = 0
+
+    async def run_all():
+        nonlocal failures
+        for _ in range(count):
+            fruit = rng.choice(fruits)
+            await driver.run_pickup_sequence(dm.FRUIT_STATIONS[fruit], lambda text: None)
+            # Every sequence must end at home with the gripper open
+            angles = [driver.Arm.Arm_serial_servo_read(i) for i in range(1, 7)]
+            home = list(dm.reachable_targets(dict(enumerate(dm.POS_HOME, start=1))).values())
+            if any(abs(a - h) > dm.POSITION_TOLERANCE for a, h in zip(angles, home)):
+                print(f"FAIL: {fruit} sequence ended at {angles}")
+                failures += 1
+
+    loop.run_until_complete(run_all())
+    loop.close()
+    return failures, clock.now(), driver.bus_writes
+
+
+def check_coalescing():
+    loop, _, driver = new_driver()
+
+    async def scenario():
+        await driver.move(dm.POS_HOME, dm.MOVE_TIME)
+        before = driver.bus_writes
+        # Arm move and gripper change issued together -> one write6
+        await asyncio.gather(driver.move(dm.POS_DROP, dm.MOVE_TIME), driver.set_gripper(dm.GRIPPER_CLOSE))
+        return driver.bus_writes - before
+
+    writes = loop.run_until_complete(scenario())
+    loop.close()
+    if writes != 1:
+        print(f"FAIL: expected 1 coalesced bus write, got {writes}")
+        return 1
+    return 0
+
+
+def check_emergency_stop():
+    loop, _, driver = new_driver()
+
+    async def scenario():
+        task = asyncio.ensure_future(
+            driver.run_pickup_sequence(dm.FRUIT_STATIONS['strawberry'], lambda text: None, planned=False))
+        await asyncio.sleep(0.7)  # Part way through the first long move
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        stopped_at = [driver.Arm.Arm_serial_servo_read(i) for i in range(1, 7)]
+        await asyncio.sleep(2.0)
+        later = [driver.Arm.Arm_serial_servo_read(i) for i in range(1, 7)]
+        return stopped_at, later
+
+    stopped_at, later = loop.run_until_complete(scenario())
+    loop.close()
+    if stopped_at != later:
+        print(f"FAIL: arm kept moving after emergency stop {stopped_at} -> {later}")
+        return 1
+    return 0
+
+
+def check_controller_stop():
+    """RoboticArmController.emergency_stop() from a status callback, then resume()."""
+    clock = dm.VirtualClock()
+    arm = dm.RoboticArmController(arm=dm.SimulatedArm(clock.now, verbose=False), clock=clock)
+
+    def stop_on_lift(text):
+        if text == "Lifting fruit...":
+            arm.emergency_stop()
+
+    try:
+        arm.run_pickup_sequence(dm.FRUIT_STATIONS['apple'], stop_on_lift)
+        print("FAIL: pickup ran to the end after emergency stop")
+        return 1
+    except dm.EmergencyStop:
+        pass
+    stopped_at = arm.read_angles()
+    clock.sleep(2.0)
+    if arm.read_angles() != stopped_at:
+        print(f"FAIL: arm kept moving after emergency stop from {stopped_at}")
+        return 1
+    try:
+        arm.return_home(lambda text: None)
+        print("FAIL: arm moved while stopped")
+        return 1
+    except dm.EmergencyStop:
+        pass
+
+    arm.resume()
+    if not arm.needs_home():
+        print("FAIL: a stopped arm must go home before the next pick")
+        return 1
+    arm.run_pickup_sequence(dm.FRUIT_STATIONS['apple'], lambda text: None)
+    if arm.pose[:5] != dm.POS_HOME[:5] or arm.motion_fault:
+        print(f"FAIL: pickup after resume ended at {arm.pose}")
+        return 1
+    return 0
+
+
+def main():
+    started = time.perf_counter()
+    failures, virtual_seconds, writes = check_sequences(SEQUENCES)
+    failures += check_coalescing()
+    failures += check_emergency_stop()
+    failures += check_controller_stop()
+    real_seconds = time.perf_counter() - started
+
+    print(f"{SEQUENCES} sequences: {virtual_seconds:.0f}s of arm time simulated in {real_seconds:.2f}s "
+          f"({writes} bus writes)")
+    if failures:
+        print(f"{failures} check(s) FAILED")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+#coding=utf-8
+# Teach the arm by hand: torque goes off, you move it, every joint is sampled as fast
+# as the servo bus answers and the path is saved as a compressed .npz.
+#
+#   python3 TrajectoryRecorder.py record wave.npz --seconds 10
+#   python3 TrajectoryRecorder.py replay wave.npz
+#   python3 TrajectoryRecorder.py station apple      # hold the arm still over the apple cube
+#   python3 TrajectoryRecorder.py record wave.npz --sim   # no hardware, records a simulated pickup
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+import DofMarket as dm
+
+
+def make_arm(sim):
+    if sim:
+        return dm.RoboticArmController(arm=dm.SimulatedArm(verbose=False))
+    return dm.RoboticArmController()
+
+
+def record(args):
+    arm = make_arm(args.sim)
+    stop = threading.Event()
+
+    if args.sim:
+        # Nobody can move a simulated arm, so play a pickup in the background instead
+        fruit = next(iter(dm.FRUIT_STATIONS))
+        mover = threading.Thread(target=lambda: (arm.run_pickup_sequence(dm.FRUIT_STATIONS[fruit], lambda text: None),
+                                                 stop.set()), daemon=True)
+    else:
+        arm.set_torque(False)
+        print("Torque off, move the arm by hand. Ctrl+C stops the recording.")
+
+    started = time.monotonic()
+    if args.sim:
+        mover.start()
+    try:
+        trajectory = dm.record_trajectory(arm.read_angles, stop=stop.is_set, max_seconds=args.seconds)
+    except KeyboardInterrupt:
+        trajectory = None
+    elapsed = time.monotonic() - started
+
+    if not args.sim:
+        arm.set_torque(True)
+    if trajectory is None or not len(trajectory.time_ms):
+        print("Nothing recorded")
+        return
+
+    trajectory.save(args.file)
+    samples = len(trajectory.time_ms)
+    print(f"Recorded {samples} samples in {elapsed:.1f} s ({samples / max(elapsed, 1e-6):.0f} Hz)")
+    print(f"Saved to {args.file} ({os.path.getsize(args.file)} bytes)")
+    print(f"Simplified to {len(trajectory.keep)} waypoints at {dm.TEACH_SIMPLIFY_TOLERANCE} degrees")
+
+
+def replay(args):
+    trajectory = dm.Trajectory.load(args.file)
+    arm = make_arm(args.sim)
+    print(f"Replaying {len(trajectory.keep)} waypoints ({trajectory.duration:.1f} s as recorded)")
+    started = time.monotonic()
+    arm.replay_trajectory(trajectory, print, keep_timing=args.keep_timing)
+    print(f"Done in {time.monotonic() - started:.1f} s")
+
+
+def station(args):
+    """Waits until the arm is held still, then saves the pose as the fruit's station."""
+    arm = make_arm(args.sim)
+    if not args.sim:
+        arm.set_torque(False)
+    print(f"Hold the arm over the {args.fruit} cube, gripper open")
+
+    window = []
+    still_since = None
+    try:
+        while True:
+            angles = arm.read_angles()
+            if None in angles:
+                time.sleep(0.02)
+                continue
+            window.append(angles)
+            lows = [min(column) for column in zip(*window)]
+            highs = [max(column) for column in zip(*window)]
+            if max(h - l for h, l in zip(highs, lows)) > dm.TEACH_STEADY_TOLERANCE:
+                window = [angles]
+                still_since = time.monotonic()
+            elif still_since is None:
+                still_since = time.monotonic()
+            elif time.monotonic() - still_since >= dm.TEACH_STEADY_TIME:
+                break
+            time.sleep(0.02)
+    except KeyboardInterrupt:
+        print("Cancelled")
+        return
+    finally:
+        if not args.sim:
+            arm.set_torque(True)
+
+    # Median of the still window, the gripper stays open for the pickup
+    pose = [sorted(column)[len(column) // 2] for column in zip(*window)]
+    pose[5] = dm.GRIPPER_OPEN
+    dm.save_taught_station(args.fruit, pose)
+    print(f"{args.fruit}: {pose} saved to {dm.STATIONS_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teach-and-replay trajectory recorder")
+    parser.add_argument('--sim', action='store_true', help="use the simulated arm")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('record', help="record a hand-moved path")
+    p.add_argument('file', help=".npz file to write")
+    p.add_argument('--seconds', type=float, default=None, help="stop after this long (default: Ctrl+C)")
+    p.set_defaults(run=record)
+
+    p = commands.add_parser('replay', help="drive the arm through a recorded path")
+    p.add_argument('file', help=".npz file to read")
+    p.add_argument('--keep-timing', action='store_true', help="move at the recorded pace")
+    p.set_defaults(run=replay)
+
+    p = commands.add_parser('station', help="teach a fruit station by holding the arm still")
+    p.add_argument('fruit', choices=sorted(dm.FRUIT_STATIONS))
+    p.set_defaults(run=station)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+#coding=utf-8
+"""
+Headless replay benchmark for the DofMarket vision pipeline.
+
+Feeds a recorded video file or a folder of images through the same stages the
+GUI uses (capture -> motion gate -> inference -> tracking -> overlay -> convert)
+without a camera, arm or display, then reports per-stage latency percentiles,
+throughput and memory and writes them to a JSON file so runs can be diffed.
+
+Examples:
+    python3 benchmark.py recordings/table.mp4 --imgsz 320 --skip 5
+    python3 benchmark.py dataset/valid/images --backend onnx --output onnx.json
+    python3 benchmark.py recordings/table.mp4 --roi 80,60,600,440 --adaptive --budget 0.2
+"""
+import os
+import sys
+import json
+import time
+import glob
+import platform
+import argparse
+import resource
+import cv2
+import numpy as np
+
+import DofMarket
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+STAGES = ['capture', 'gate', 'inference', 'track', 'overlay', 'convert', 'frame_total']
+
+
+def frame_source(path, loops):
+    """Yields BGR frames from a video file or an image folder, timing each read."""
+    for _ in range(loops):
+        if os.path.isdir(path):
+            files = sorted(f for f in glob.glob(os.path.join(path, '*'))
+                           if f.lower().endswith(IMAGE_EXTENSIONS))
+            for f in files:
+                started = time.perf_counter()
+                frame = cv2.imread(f)
+                if frame is not None:
+                    yield frame, time.perf_counter() - started
+        else:
+            cap = cv2.VideoCapture(path)
+            while True:
+                started = time.perf_counter()
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield frame, time.perf_counter() - started
+            cap.release()
+
+
+def parse_roi(text):
+    x1, y1, x2, y2 = (int(v) for v in text.split(','))
+    return (x1, y1, x2, y2)
+
+
+def current_rss_mb():
+    # Resident set size from /proc, Linux only
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def summarize(samples):
+    if not samples:
+        return {'count': 0}
+    ms = np.asarray(samples) * 1000.0
+    return {
+        'count': int(ms.size),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
+
+
+def run(args):
+    detector = None
+    if not args.no_model:
+        detector = DofMarket.Detector(args.model, args.backend)
+    names = detector.names if detector else {}
+    gate = DofMarket.MotionGate() if args.motion_gate else None
+    controller = None
+    if detector and args.adaptive:
+        controller = DofMarket.ImgszController(budget=args.budget, start=args.imgsz)
+    imgsz_used = {}
+    tracker = DofMarket.Tracker()
+    renderer = DofMarket.FrameRenderer()
+
+    timings = {stage: [] for stage in STAGES}
+    rss_start = current_rss_mb()
+    frames = 0
+    inferences = 0
+    wall_start = None
+
+    for index, (frame, capture_time) in enumerate(frame_source(args.source, args.loops)):
+        if args.frames and frames >= args.frames + args.warmup:
+            break
+        # Replay time drives the tracker so results do not depend on machine speed
+        frame_time = index / args.fps
+        stage_times = {'capture': capture_time}
+        frame_start = time.perf_counter()
+
+        # 1. Motion gate + inference (every --skip frames, like the old SKIP_FRAMES)
+        run_detector = detector is not None and index % args.skip == 0
+        if run_detector and gate:
+            t = time.perf_counter()
+            run_detector = gate.should_run(frame)
+            stage_times['gate'] = time.perf_counter() - t
+
+        detections = None
+        if run_detector:
+            imgsz = controller.imgsz if controller else args.imgsz
+            t = time.perf_counter()
+            detections = detector.detect(frame, conf=args.conf, imgsz=imgsz, roi=args.roi)
+            stage_times['inference'] = time.perf_counter() - t
+            if controller:
+                controller.update(stage_times['inference'], detections)
+
+        # 2. Tracking
+        t = time.perf_counter()
+        if detections is not None:
+            tracker.update(detections, frame_time)
+        tracks = tracker.predict(frame_time)
+        stage_times['track'] = time.perf_counter() - t
+
+        # 3. Overlay on a private copy, as the GUI does
+        t = time.perf_counter()
+        canvas = frame.copy()
+        DofMarket.draw_tracks(canvas, tracks, names)
+        stage_times['overlay'] = time.perf_counter() - t
+
+        # 4. Conversion to the display image (everything but the Tk blit)
+        t = time.perf_counter()
+        renderer.to_image(canvas)
+        stage_times['convert'] = time.perf_counter() - t
+
+        stage_times['frame_total'] = capture_time + (time.perf_counter() - frame_start)
+
+        frames += 1
+        if frames <= args.warmup:
+            continue
+        if wall_start is None:
+            wall_start = time.perf_counter()
+        if detections is not None:
+            inferences += 1
+            imgsz_used[imgsz] = imgsz_used.get(imgsz, 0) + 1
+        for stage, value in stage_times.items():
+            timings[stage].append(value)
+
+    measured = max(frames - args.warmup, 0)
+    wall = (time.perf_counter() - wall_start) if wall_start else 0.0
+
+    return {
+        'config': {
+            'source': args.source,
+            'model': None if args.no_model else args.model,
+            'backend': detector.backend if detector else None,
+            'imgsz': args.imgsz,
+            'adaptive': args.adaptive,
+            'budget_s': args.budget if args.adaptive else None,
+            'roi': args.roi,
+            'conf': args.conf,
+            'skip': args.skip,
+            'motion_gate': args.motion_gate,
+            'warmup': args.warmup,
+        },
+        'host': {
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'cpus': os.cpu_count(),
+        },
+        'stages': {stage: summarize(values) for stage, values in timings.items()},
+        'imgsz_used': {str(size): count for size, count in sorted(imgsz_used.items())},
+        'throughput': {
+            'frames': measured,
+            'inferences': inferences,
+            'wall_s': round(wall, 3),
+            'fps': round(measured / wall, 2) if wall > 0 else None,
+            'inferences_per_s': round(inferences / wall, 2) if wall > 0 else None,
+        },
+        'memory': {
+            'rss_start_mb': rss_start,
+            'rss_end_mb': current_rss_mb(),
+            # ru_maxrss is in kilobytes on Linux
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+    }
+
+
+def print_report(results):
+    print(f"\n{'Stage':<12}{'n':>7}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    for stage, stats in results['stages'].items():
+        if not stats['count']:
+            continue
+        print(f"{stage:<12}{stats['count']:>7}{stats['mean_ms']:>9.2f}{stats['p50_ms']:>9.2f}"
+              f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}")
+    tp = results['throughput']
+    mem = results['memory']
+    print(f"\nFrames: {tp['frames']}  FPS: {tp['fps']}  Inferences/s: {tp['inferences_per_s']}")
+    if results['imgsz_used']:
+        print(f"Inferences per imgsz: {results['imgsz_used']}")
+    print(f"Peak RSS: {mem['peak_rss_mb']:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless DofMarket vision pipeline benchmark")
+    parser.add_argument('source', help="video file or folder of images")
+    parser.add_argument('--model', default=DofMarket.MODEL_PATH, help="path to best.pt (exports are found next to it)")
+    parser.add_argument('--backend', default=DofMarket.BACKEND, help="auto, torch, onnx, openvino, tflite, ...")
+    parser.add_argument('--imgsz', type=int, default=DofMarket.DETECT_IMGSZ)
+    parser.add_argument('--adaptive', action='store_true', help="let ImgszController pick imgsz within --budget")
+    parser.add_argument('--budget', type=float, default=DofMarket.INFERENCE_BUDGET, help="seconds per inference for --adaptive")
+    parser.add_argument('--roi', type=parse_roi, default=DofMarket.INFERENCE_ROI, help="x1,y1,x2,y2 region to run YOLO on")
+    parser.add_argument('--conf', type=float, default=DofMarket.DETECT_CONF)
+    parser.add_argument('--skip', type=int, default=1, help="run detection every N frames")
+    parser.add_argument('--motion-gate', action='store_true', help="gate detection with MotionGate")
+    parser.add_argument('--no-model', action='store_true', help="benchmark the pipeline without inference")
+    parser.add_argument('--frames', type=int, default=0, help="stop after N measured frames (0 = whole source)")
+    parser.add_argument('--loops', type=int, default=1, help="replay the source this many times")
+    parser.add_argument('--warmup', type=int, default=5, help="frames excluded from the statistics")
+    parser.add_argument('--fps', type=float, default=30.0, help="replay frame rate used for tracking")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON results file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f" Error: Could not find {args.source}")
+        sys.exit(1)
+    args.skip = max(args.skip, 1)
+
+    results = run(args)
+    print_report(results)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
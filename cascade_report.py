@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+#coding=utf-8
+"""
+Offline accuracy / latency report for the colour cascade (COLOR_CASCADE).
+
+Runs every image of a dataset split through the HSV ColorClassifier, through YOLO
+and through the app's CascadeDetector, and scores colour only, YOLO only and the
+cascade against the ground-truth labels. The images are replayed in file order as a
+stream at --fps, so the cascade's class check and CASCADE_VERIFY_INTERVAL apply as
+they do on the live feed. Prints precision / recall at IoU 0.5, how many frames the
+cascade settled by colour and how much inference time it saves, and writes the
+numbers to JSON.
+
+color_settled only scores the frames colour was sure about, an upper bound for what
+the cascade can settle. On a dataset of unrelated stills the class check sends most
+frames to YOLO, so use a recorded sequence (e.g. --data with frames from the kiosk
+camera) for numbers that match the live app.
+
+Examples:
+    python3 cascade_report.py models/fruit_yolo11/weights/best.pt
+    python3 cascade_report.py --split test --no-model     # tune COLOR_RANGES without YOLO
+"""
+import os
+import json
+import glob
+import time
+import argparse
+import cv2
+import numpy as np
+import yaml
+
+import DofMarket
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, os.pardir))
+DATA_DIR = os.path.join(ROOT_DIR, 'dataset')
+WEIGHTS_PATH = os.path.join(ROOT_DIR, 'models', 'fruit_yolo11', 'weights', 'best.pt')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+MATCH_IOU = 0.5
+REPLAY_FPS = 10.0   # Frames per second the cascade sees, about what the Pi's detector manages
+
+
+def load_names(data_dir):
+    with open(os.path.join(data_dir, 'data.yaml')) as f:
+        names = yaml.safe_load(f)['names']
+    # data.yaml has either a list or an {id: name} mapping
+    return dict(enumerate(names)) if isinstance(names, list) else names
+
+
+def load_labels(label_path, width, height):
+    """YOLO txt labels (cls cx cy w h, normalised) as a DETECTION_DTYPE array in pixels."""
+    rows = np.loadtxt(label_path, ndmin=2) if os.path.exists(label_path) else np.zeros((0, 5))
+    labels = DofMarket.empty_detections(len(rows))
+    if len(rows):
+        cx, cy = rows[:, 1] * width, rows[:, 2] * height
+        w, h = rows[:, 3] * width, rows[:, 4] * height
+        labels['xyxy'] = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        labels['cls'] = rows[:, 0]
+        labels['conf'] = 1.0
+    return labels
+
+
+def match(detections, labels):
+    """(true positives, false positives, false negatives), greedy per-class matching at MATCH_IOU."""
+    if not len(detections) or not len(labels):
+        return 0, len(detections), len(labels)
+    iou = DofMarket.box_iou(detections['xyxy'], labels['xyxy'])
+    iou[detections['cls'][:, None] != labels['cls'][None, :]] = 0.0
+    used_dets, used_labels = set(), set()
+    for flat in np.argsort(-iou, axis=None):
+        di, li = np.unravel_index(flat, iou.shape)
+        if iou[di, li] < MATCH_IOU:
+            break
+        if di in used_dets or li in used_labels:
+            continue
+        used_dets.add(di)
+        used_labels.add(li)
+    tp = len(used_dets)
+    return tp, len(detections) - tp, len(labels) - tp
+
+
+class Score:
+    def __init__(self):
+        self.tp = self.fp = self.fn = 0
+        self.exact_frames = 0   # Frames with every fruit found and nothing extra
+        self.frames = 0
+        self.seconds = 0.0
+
+    def add(self, detections, labels, seconds):
+        tp, fp, fn = match(detections, labels)
+        self.tp += tp
+        self.fp += fp
+        self.fn += fn
+        self.exact_frames += fp == 0 and fn == 0
+        self.frames += 1
+        self.seconds += seconds
+
+    def summary(self):
+        return {
+            'frames': self.frames,
+            'precision': round(self.tp / max(self.tp + self.fp, 1), 4),
+            'recall': round(self.tp / max(self.tp + self.fn, 1), 4),
+            'exact_frames': round(self.exact_frames / max(self.frames, 1), 4),
+            'mean_ms': round(1000.0 * self.seconds / max(self.frames, 1), 2),
+        }
+
+
+def run(args):
+    split_dir = os.path.join(args.data, args.split)
+    images = sorted(f for f in glob.glob(os.path.join(split_dir, 'images', '*'))
+                    if f.lower().endswith(IMAGE_EXTENSIONS))
+    detector = None if args.no_model else DofMarket.Detector(args.model, args.backend)
+    names = detector.names if detector else load_names(args.data)
+    colors = DofMarket.ColorClassifier(names)
+    # The cascade sees the images as a stream, one every 1 / fps seconds
+    frame_time = 0.0
+    cascade = DofMarket.CascadeDetector(detector, clock=lambda: frame_time) if detector else None
+
+    scores = {'color': Score(), 'color_settled': Score(), 'yolo': Score(), 'cascade': Score()}
+    for path in images:
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        height, width = frame.shape[:2]
+        label_path = os.path.join(split_dir, 'labels', os.path.splitext(os.path.basename(path))[0] + '.txt')
+        labels = load_labels(label_path, width, height)
+
+        # 1. Colour stage
+        started = time.perf_counter()
+        color_dets, sure = colors.classify(frame, roi=None)
+        color_time = time.perf_counter() - started
+        scores['color'].add(color_dets, labels, color_time)
+        if sure:
+            scores['color_settled'].add(color_dets, labels, color_time)
+
+        if detector is None:
+            continue
+
+        # 2. YOLO alone
+        started = time.perf_counter()
+        yolo_dets = detector.detect(frame, conf=args.conf, imgsz=args.imgsz, roi=None)
+        scores['yolo'].add(yolo_dets, labels, time.perf_counter() - started)
+
+        # 3. The cascade exactly as the app runs it
+        frame_time += 1.0 / args.fps
+        started = time.perf_counter()
+        cascade_dets = cascade.detect(frame, conf=args.conf, imgsz=args.imgsz, roi=None)
+        scores['cascade'].add(cascade_dets, labels, time.perf_counter() - started)
+
+    results = {name: score.summary() for name, score in scores.items() if score.frames}
+    results['settled_share'] = round(scores['color_settled'].frames / max(scores['color'].frames, 1), 4)
+    if cascade is not None:
+        results['cascade_settled_share'] = round(cascade.settled / max(cascade.settled + cascade.deferred, 1), 4)
+    if detector is not None and scores['yolo'].seconds > 0:
+        results['time_saved'] = round(1.0 - scores['cascade'].seconds / scores['yolo'].seconds, 4)
+    results['config'] = {
+        'split': args.split,
+        'model': None if args.no_model else args.model,
+        'backend': detector.backend if detector else None,
+        'imgsz': args.imgsz,
+        'conf': args.conf,
+        'fps': args.fps,
+        'verify_interval': DofMarket.CASCADE_VERIFY_INTERVAL,
+        'color_ranges': DofMarket.COLOR_RANGES,
+    }
+    return results
+
+
+def print_report(results):
+    print(f"\n{'Stage':<16}{'frames':>8}{'precision':>11}{'recall':>9}{'exact':>8}{'mean ms':>10}")
+    for name in ['color', 'color_settled', 'yolo', 'cascade']:
+        if name not in results:
+            continue
+        r = results[name]
+        print(f"{name:<16}{r['frames']:>8}{r['precision']:>11.3f}{r['recall']:>9.3f}"
+              f"{r['exact_frames']:>8.1%}{r['mean_ms']:>10.2f}")
+    print(f"\nColour was sure on {results['settled_share']:.0%} of frames (upper bound, color_settled)")
+    if 'cascade_settled_share' in results:
+        print(f"The cascade settled {results['cascade_settled_share']:.0%} of frames without YOLO")
+    if 'time_saved' in results:
+        print(f"Cascade saves {results['time_saved']:.0%} of the YOLO-only inference time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Colour cascade accuracy / latency report")
+    parser.add_argument('model', nargs='?', default=WEIGHTS_PATH, help="path to best.pt (exports are found next to it)")
+    parser.add_argument('--data', default=DATA_DIR, help="dataset folder with data.yaml")
+    parser.add_argument('--split', default='valid', help="train, valid or test")
+    parser.add_argument('--backend', default=DofMarket.BACKEND)
+    parser.add_argument('--imgsz', type=int, default=DofMarket.DETECT_IMGSZ)
+    parser.add_argument('--conf', type=float, default=DofMarket.DETECT_CONF)
+    parser.add_argument('--fps', type=float, default=REPLAY_FPS,
+                        help="rate the images are replayed at through the cascade")
+    parser.add_argument('--no-model', action='store_true', help="score the colour stage only")
+    parser.add_argument('--output', default='cascade_report.json', help="JSON results file")
+    args = parser.parse_args()
+
+    results = run(args)
+    print_report(results)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+from ultralytics import YOLO
+
+# Configuration
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, os.pardir))
+MODEL_DIR = os.path.join(ROOT_DIR, 'models')
+
+# Weights produced by yolo11ntrain.py
+WEIGHTS_PATH = os.path.join(MODEL_DIR, 'fruit_yolo11', 'weights', 'best.pt')
+
+IMG_SIZE = 640
+
+# CPU-only runtimes for the Pi. DofMarket.py looks for these next to best.pt.
+EXPORT_FORMATS = [
+    # (format, extra export arguments)
+    ('onnx', {'simplify': True, 'dynamic': True}),
+    ('openvino', {'dynamic': True}),
+    ('tflite', {}),
+]
+
+
+def main():
+    # 1. Find the trained weights (optional path on the command line)
+    weights = sys.argv[1] if len(sys.argv) > 1 else WEIGHTS_PATH
+
+    if not os.path.exists(weights):
+        print(f" Error: Could not find trained weights at {weights}")
+        return
+
+    print(f"Loading {weights}")
+    model = YOLO(weights)
+
+    # 2. Export every format, one failure should not stop the others
+    exported = []
+    for fmt, extra_args in EXPORT_FORMATS:
+        print(f"\n Exporting to {fmt}")
+        try:
+            path = model.export(format=fmt, imgsz=IMG_SIZE, device='cpu', **extra_args)
+            exported.append((fmt, path))
+        except Exception as e:
+            print(f" Export to {fmt} failed: {e}")
+
+    # 3. Summary
+    print("\nExport Complete. Artifacts:")
+    for fmt, path in exported:
+        print(f"  {fmt:<9} {path}")
+    print("\nCopy them next to best.pt on the Pi, DofMarket.py picks the fastest available one.")
+
+
+if __name__ == '__main__':
+    main()
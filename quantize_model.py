@@ -0,0 +1,118 @@
+import os
+import sys
+import shutil
+import yaml
+from ultralytics import YOLO
+
+import DofMarket
+
+# Configuration
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, os.pardir))
+DATA_DIR = os.path.join(ROOT_DIR, 'dataset')
+MODEL_DIR = os.path.join(ROOT_DIR, 'models')
+
+# Weights produced by yolo11ntrain.py
+WEIGHTS_PATH = os.path.join(MODEL_DIR, 'fruit_yolo11', 'weights', 'best.pt')
+
+IMG_SIZE = 640
+CALIBRATION_FRACTION = 0.25  # Share of the training images used to calibrate INT8 ranges
+MAX_MAP_DROP = 0.02          # Largest mAP@50-95 loss we accept for an INT8 model
+
+# Runtimes with INT8 CPU kernels. DofMarket.py loads these as the *_int8 backends.
+INT8_FORMATS = ['openvino', 'tflite']
+
+
+def int8_artifact(export_path, fmt):
+    # Depending on the ultralytics version tflite export returns either the .tflite
+    # file or the saved_model folder, the INT8 file sits inside that folder
+    if fmt == 'tflite' and not export_path.endswith('.tflite'):
+        stem = os.path.basename(export_path).replace('_saved_model', '')
+        return os.path.join(export_path, f"{stem}_int8.tflite")
+    return export_path
+
+
+def calibration_yaml(yaml_file):
+    """
+    Copy of data.yaml whose 'val' split points at the training images. Export calibrates
+    INT8 ranges on 'val', and scoring the model on the images it was calibrated on
+    would flatter it.
+    """
+    with open(yaml_file) as f:
+        data = yaml.safe_load(f)
+    data_dir = os.path.dirname(os.path.abspath(yaml_file))
+    data['path'] = os.path.join(data_dir, data.get('path') or '')
+    data['val'] = data['train']
+    path = os.path.join(data_dir, 'calibration.yaml')
+    with open(path, 'w') as f:
+        yaml.safe_dump(data, f)
+    return path
+
+
+def remove_artifact(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def evaluate(model_path, yaml_file):
+    model = YOLO(model_path, task='detect')
+    metrics = model.val(data=yaml_file, split='val', imgsz=IMG_SIZE, batch=1, device='cpu', verbose=False)
+    return metrics.box.map50, metrics.box.map, metrics.speed['inference']
+
+
+def main():
+    # 1. Setup Data Configuration (same dataset as training)
+    yaml_file = os.path.join(DATA_DIR, 'data.yaml')
+    weights = sys.argv[1] if len(sys.argv) > 1 else WEIGHTS_PATH
+
+    if not os.path.exists(yaml_file):
+        print(f" Error: Could not find dataset config at {yaml_file}")
+        return
+    if not os.path.exists(weights):
+        print(f" Error: Could not find trained weights at {weights}")
+        return
+
+    # 2. Baseline FP32 accuracy
+    print("\n CALCULATING FP32 ACCURACY ")
+    rows = [('FP32 (torch)', weights) + evaluate(weights, yaml_file)]
+
+    # 3. Quantize with training images, then score each INT8 model on the validation split
+    model = YOLO(weights)
+    calibration_file = calibration_yaml(yaml_file)
+    for fmt in INT8_FORMATS:
+        print(f"\n Quantizing to INT8 {fmt}")
+        try:
+            path = model.export(format=fmt, int8=True, data=calibration_file, fraction=CALIBRATION_FRACTION,
+                                imgsz=IMG_SIZE, device='cpu')
+            path = int8_artifact(path, fmt)
+            rows.append((f"INT8 ({fmt})", path) + evaluate(path, yaml_file))
+        except Exception as e:
+            print(f" INT8 {fmt} failed: {e}")
+
+    os.remove(calibration_file)
+
+    # 4. Report accuracy / latency side by side. Accepted models get the marker
+    # DofMarket.py looks for, rejected ones are deleted so they can never be loaded.
+    base_map50, base_map = rows[0][2], rows[0][3]
+    print("\n QUANTIZATION REPORT ")
+    print(f"{'Model':<16}{'mAP@50':>8}{'mAP@50-95':>11}{'ms/img':>9}  Verdict")
+    for name, path, map50, map5095, speed in rows:
+        if name.startswith('FP32'):
+            verdict = "baseline"
+        elif base_map - map5095 <= MAX_MAP_DROP:
+            verdict = f"ACCEPT ({map50 - base_map50:+.3f} / {map5095 - base_map:+.3f})"
+            with open(path + DofMarket.INT8_ACCEPTED_SUFFIX, 'w') as f:
+                f.write(f"{map50:.4f} {map5095:.4f}\n")
+        else:
+            verdict = f"REJECT ({map50 - base_map50:+.3f} / {map5095 - base_map:+.3f}), deleted"
+            remove_artifact(path)
+            remove_artifact(path + DofMarket.INT8_ACCEPTED_SUFFIX)
+        print(f"{name:<16}{map50:>8.2f}{map5095:>11.2f}{speed:>9.1f}  {verdict}")
+
+    print("\nAccepted INT8 models stay next to best.pt, DofMarket.py prefers them.")
+
+
+if __name__ == '__main__':
+    main()